@@ -0,0 +1,163 @@
+"""
+Storage of benchmark results, comparison against a baseline and of pairs
+of alternative implementations.
+
+Results are stored in a JSON lines file, one run (an invocation of a
+benchmark module) per line. To compare two stores, run
+
+    python results.py compare baseline.jsonl results.jsonl --threshold 0.1
+
+which lists the tests whose median time increased by more than 10 % and
+exits with status 1 if there are any.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+
+def git_revision(path):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=path, capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cpu_info():
+    model = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return dict(model=model, machine=platform.machine(),
+                count=os.cpu_count())
+
+
+def environment():
+    """Versions, hardware and revisions under which the benchmarks run"""
+    import numpy
+    import Orange
+    return dict(
+        python=platform.python_version(),
+        orange=Orange.__version__,
+        numpy=numpy.__version__,
+        platform=platform.platform(),
+        cpu=cpu_info(),
+        orange_revision=git_revision(os.path.dirname(Orange.__file__)),
+        revision=git_revision(os.path.dirname(os.path.abspath(__file__))))
+
+
+def save_run(filename, results):
+    """Append a run with the given test results to the store"""
+    run = dict(timestamp=datetime.datetime.now().isoformat(timespec="seconds"),
+               environment=environment(),
+               results=results)
+    with open(filename, "at") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def load_runs(filename):
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def latest_results(filename):
+    """Dictionary with the latest result for each test in the store"""
+    return {result["id"]: result
+            for run in load_runs(filename) for result in run["results"]}
+
+
+def compare(baseline, current, threshold):
+    """
+    Compare medians of tests in both stores.
+
+    Return a list of tuples (test id, baseline median, current median, ratio)
+    for tests that were slowed by more than `threshold` (relative).
+    """
+    regressions = []
+    for test_id, result in sorted(current.items()):
+        base = baseline.get(test_id)
+        if base is None or not base["median"]:
+            continue
+        ratio = result["median"] / base["median"]
+        if ratio > 1 + threshold:
+            regressions.append((test_id, base["median"], result["median"], ratio))
+    return regressions
+
+
+def speedups(results, base, other):
+    """
+    Pair tests with the same name from classes `base` and `other`.
+
+    Return a list of tuples (test name, time in `base`, time in `other`,
+    speed-up).
+    """
+    times = {}
+    for test_id, result in results.items():
+        cls, name = test_id.split(".")[-2:]
+        times[cls, name] = result["median"]
+    return [(name, t, times[other, name], t / times[other, name])
+            for (cls, name), t in sorted(times.items())
+            if cls == base and times.get((other, name))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark results.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("show", help="show the latest results")
+    show.add_argument("store")
+
+    speed = commands.add_parser(
+        "speedup", help="compare equally named tests from two classes")
+    speed.add_argument("store")
+    speed.add_argument("base", nargs="?", default="TestDataAccess")
+    speed.add_argument("other", nargs="?", default="TestDataAccessVectorized")
+
+    comp = commands.add_parser(
+        "compare", help="report tests that are slower than the baseline")
+    comp.add_argument("baseline")
+    comp.add_argument("store")
+    comp.add_argument("-t", "--threshold", type=float, default=0.1,
+                      help="allowed relative slow-down (default: 0.1)")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for test_id, result in sorted(latest_results(args.store).items()):
+            print("%-70s %.6f (iqr %.6f, %d rounds)"
+                  % (test_id, result["median"], result["iqr"], result["rounds"]))
+        return 0
+
+    if args.command == "speedup":
+        print("%-30s %12s %12s %9s" % ("test", args.base, args.other, "speed-up"))
+        for name, before, after, ratio in speedups(
+                latest_results(args.store), args.base, args.other):
+            print("%-30s %12.6f %12.6f %8.1fx" % (name, before, after, ratio))
+        return 0
+
+    baseline = latest_results(args.baseline)
+    current = latest_results(args.store)
+    missing = sorted(set(baseline) - set(current))
+    for test_id in missing:
+        print("MISSING %s" % test_id)
+    regressions = compare(baseline, current, args.threshold)
+    for test_id, before, after, ratio in regressions:
+        print("SLOWER %s: %.6f -> %.6f (%+.1f%%)"
+              % (test_id, before, after, (ratio - 1) * 100))
+    print("%d of %d tests slower than the baseline by more than %.0f%%"
+          % (len(regressions), len(current), args.threshold * 100))
+    return int(bool(regressions))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
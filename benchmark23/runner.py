@@ -0,0 +1,109 @@
+"""
+Run benchmark test classes in parallel.
+
+Test classes are distributed across a pool of worker processes. Each worker
+is pinned to its own CPU core (where the OS supports it) and runs one class
+at a time, so measurements of different classes do not compete for a core.
+Data sets are loaded once per worker and shared by the tests it runs.
+
+    python runner.py [-j WORKERS] [module or module.Class ...]
+
+Options of the timing harness (--repeat, --memory, --store, ...) apply to
+all tests.
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import timetest
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def test_classes(names):
+    """Qualified names of test classes in the given modules or classes"""
+    classes = []
+    for name in names:
+        module_name, _, class_name = name.partition(".")
+        module = importlib.import_module(module_name)
+        if class_name:
+            classes.append(name)
+            continue
+        classes += [
+            "%s.%s" % (module_name, attr) for attr, cls in vars(module).items()
+            if isinstance(cls, type) and issubclass(cls, unittest.TestCase)
+            and cls.__module__ == module_name
+            and unittest.defaultTestLoader.getTestCaseNames(cls)]
+    return classes
+
+
+def init_worker(cores, options):
+    core = cores.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    vars(timetest.OPTIONS).update(vars(options))
+
+
+def run_class(name):
+    """Run tests from a class; return its output, results and success"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        suite = unittest.defaultTestLoader.loadTestsFromName(name)
+        result = unittest.TextTestRunner(stream=output).run(suite)
+    results = timetest.RESULTS[:]
+    timetest.RESULTS.clear()
+    return output.getvalue(), results, result.wasSuccessful()
+
+
+def main():
+    cores = available_cores()
+    parser = argparse.ArgumentParser(description="Run benchmarks in parallel.")
+    parser.add_argument("tests", nargs="*",
+                        help="modules or classes (default: all test modules)")
+    parser.add_argument("-j", "--workers", type=int,
+                        default=max(1, len(cores) - 1),
+                        help="number of worker processes "
+                             "(default: one less than the number of cores)")
+    args = parser.parse_args()
+
+    names = args.tests or sorted(
+        os.path.splitext(os.path.basename(f))[0]
+        for f in glob.glob(os.path.join(os.path.dirname(__file__), "test_*.py")))
+    classes = test_classes(names)
+    workers = min(args.workers, len(cores), len(classes))
+
+    # Workers get the last cores; the first is left to the main process
+    core_queue = multiprocessing.Queue()
+    for core in cores[-workers:]:
+        core_queue.put(core)
+
+    start = time.perf_counter()
+    success = True
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(core_queue, timetest.OPTIONS)) as pool:
+        for name, (output, results, ok) in zip(
+                classes, pool.map(run_class, classes)):
+            print("== %s" % name)
+            print(output)
+            timetest.RESULTS.extend(results)
+            success = success and ok
+    print("Ran %d classes on %d workers in %.1f s"
+          % (len(classes), workers, time.perf_counter() - start))
+    return int(not success)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Scaling benchmarks: time the operations from the other benchmarks on
+synthetic tables of growing size and estimate the empirical growth exponents,
+that is, k in time ~ size^k, separately for rows and columns.
+
+    python scaling.py --rows 1e3 1e4 1e5 --columns 10 100 -o kmeans tree
+
+Rows are swept with the smallest number of columns and columns with the
+smallest number of rows. An operation is dropped from the sweep before a size
+at which its time, extrapolated with the last local exponent, would exceed
+--max-time; tables larger than --max-cells are skipped. Options of the timing
+harness (--repeat, --min-time, --store) also apply.
+"""
+
+import argparse
+import math
+import os
+import tempfile
+
+import numpy as np
+
+from timetest import RESULTS, Orange, measure
+from test_simpletree import SimpleTreeLearner
+from test_svm import SVM
+
+
+def synthetic_table(rows, columns, seed=0):
+    """Table with normally distributed features and a binary class"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, columns))
+    y = (X[:, 0] + 0.5 * rng.standard_normal(rows) > 0).astype(float)
+    domain = Orange.data.Domain(
+        [Orange.data.ContinuousVariable("a%d" % i) for i in range(columns)],
+        Orange.data.DiscreteVariable("class", values=("neg", "pos")))
+    return Orange.data.Table.from_numpy(domain, X, y)
+
+
+# Each operation takes a table and a temporary directory and returns
+# a function to be timed
+
+def load(data, tmpdir):
+    filename = os.path.join(tmpdir, "data.tab")
+    data.save(filename)
+    return lambda: Orange.data.Table(filename)
+
+
+def iterate(data, _):
+    def iterate_rows():
+        for row in data:
+            for value in row:
+                pass
+    return iterate_rows
+
+
+def convert(data, _):
+    domain = Orange.data.Domain(data.domain.attributes[::2],
+                                data.domain.class_var)
+    return lambda: Orange.data.Table.from_table(domain, data)
+
+
+def kmeans(data, _):
+    cl = Orange.clustering.KMeans(n_clusters=3)
+    return lambda: cl(data)
+
+
+def tree(data, _):
+    return lambda: SimpleTreeLearner()(data)
+
+
+def svm(data, _):
+    return lambda: SVM(data)
+
+
+OPERATIONS = dict(load=load, iterate=iterate, convert=convert,
+                  kmeans=kmeans, tree=tree, svm=svm)
+
+
+def growth_exponent(sizes, times):
+    """Slope of the least-squares line through log-log points"""
+    return np.polyfit(np.log(sizes), np.log(times), 1)[0]
+
+
+def predicted_time(points, size):
+    """
+    Time at the given size, extrapolated from the last two points with
+    their local exponent (taken to be at least 1, since every operation
+    at least reads all the data)
+    """
+    if not points:
+        return 0
+    last_size, last_t = points[-1]
+    k = 1
+    if len(points) > 1 and last_t > 0 and points[-2][1] > 0:
+        prev_size, prev_t = points[-2]
+        k = max(k, math.log(last_t / prev_t) / math.log(last_size / prev_size))
+    return last_t * (size / last_size) ** k
+
+
+def sweep(operations, shapes, axis, args, tmpdir):
+    """
+    Time the operations on tables of the given shapes and print the times,
+    the exponents between consecutive sizes and the fitted exponent.
+    """
+    timings = {name: [] for name in operations}
+    dropped = set()
+    for rows, columns in shapes:
+        if rows * columns > args.max_cells:
+            print("skipping %d x %d: more than %d cells"
+                  % (rows, columns, args.max_cells))
+            continue
+        size = rows if axis == "rows" else columns
+        for name in operations:
+            if name in dropped:
+                continue
+            estimate = predicted_time(timings[name], size)
+            if estimate > args.max_time:
+                print("dropping %s at %d x %d: estimated %.0f s"
+                      % (name, rows, columns, estimate))
+                dropped.add(name)
+        active = [name for name in operations if name not in dropped]
+        if not active:
+            break
+        data = synthetic_table(rows, columns)
+        for name in active:
+            stats = measure(OPERATIONS[name](data, tmpdir))
+            RESULTS.append(dict(id="scaling.%s[%dx%d]" % (name, rows, columns),
+                                rows=rows, columns=columns, **stats))
+            timings[name].append((size, stats["median"]))
+            print("SCALING %s %d x %d: %.6f" % (name, rows, columns,
+                                                 stats["median"]))
+        del data
+
+    fixed = "columns=%d" % shapes[0][1] if axis == "rows" \
+        else "rows=%d" % shapes[0][0]
+    for name, points in timings.items():
+        print()
+        print("%s over %s (%s)" % (name, axis, fixed))
+        for i, (size, t) in enumerate(points):
+            if i and t > 0 and points[i - 1][1] > 0:
+                prev_size, prev_t = points[i - 1]
+                local = "  k=%.2f" % (math.log(t / prev_t)
+                                      / math.log(size / prev_size))
+            else:
+                local = ""
+            print("%12d %12.6f%s" % (size, t, local))
+        if len(points) > 1 and all(t > 0 for _, t in points):
+            print("growth exponent: %.2f"
+                  % growth_exponent(*zip(*points)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmarks.")
+    parser.add_argument("-o", "--operations", nargs="+",
+                        choices=list(OPERATIONS), default=list(OPERATIONS),
+                        metavar="OPERATION",
+                        help="operations to time: %s (default: all)"
+                             % ", ".join(OPERATIONS))
+    parser.add_argument("--rows", type=float, nargs="+",
+                        default=[1e3, 1e4, 1e5, 1e6, 1e7])
+    parser.add_argument("--columns", type=float, nargs="+",
+                        default=[10, 100, 1000, 10000])
+    parser.add_argument("--max-cells", type=float, default=1e8,
+                        help="skip tables with more cells (default: 1e8)")
+    parser.add_argument("--max-time", type=float, default=60,
+                        help="drop an operation from the sweep when its "
+                             "time at the next size, extrapolated from the "
+                             "previous sizes, is longer (default: 60 s)")
+    args = parser.parse_args()
+
+    operations = args.operations
+    rows = sorted(int(r) for r in args.rows)
+    columns = sorted(int(c) for c in args.columns)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sweep(operations, [(r, columns[0]) for r in rows], "rows", args, tmpdir)
+        print()
+        sweep(operations, [(rows[0], c) for c in columns], "columns", args,
+              tmpdir)
+
+
+if __name__ == "__main__":
+    main()
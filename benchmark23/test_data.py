@@ -1,3 +1,5 @@
+import contextlib
+import numpy as np
 from timetest import *
 
 class TestLoad(TimeTest):
@@ -11,7 +13,7 @@ class TestLoad(TimeTest):
 class TestDataAccess(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("adult")
+        self.data = dataset("adult")
 
     def test_str(self):
         for a in self.data:
@@ -38,5 +40,52 @@ class TestDataAccess(TimeTest):
         dom = Orange.data.Domain(self.data.domain.attributes[4:10], self.data.domain.class_var)
         d = Orange.data.Table(dom, self.data)
 
+def column_strings(var, col):
+    """Values of a column formatted as strings"""
+    if var.is_discrete:
+        col = col.astype(float)
+        values = np.array(list(var.values) + ["?"], dtype=object)
+        return values[np.where(np.isnan(col), len(var.values), col).astype(int)]
+    if var.is_continuous:
+        col = col.astype(float)
+        strings = np.char.mod("%%.%df" % var.number_of_decimals, col)
+        return np.where(np.isnan(col), "?", strings)
+    return col.astype(str)
+
+@unittest.skipUnless(ORANGE3, "requires Orange 3")
+class TestDataAccessVectorized(TimeTest):
+    """The same work as in TestDataAccess through arrays instead of rows"""
+
+    def setUp(self):
+        self.data = dataset("adult")
+
+    def columns(self):
+        domain, data = self.data.domain, self.data
+        Y = data.Y.reshape(len(data), -1)
+        for part, variables in ((data.X, domain.attributes),
+                                (Y, domain.class_vars),
+                                (data.metas, domain.metas)):
+            for i, var in enumerate(variables):
+                yield var, part[:, i]
+
+    def test_str(self):
+        strings = [column_strings(var, col) for var, col in self.columns()]
+        for row in zip(*strings):
+            "[%s]" % ", ".join(row)
+
+    def test_read_values(self):
+        for var, col in self.columns():
+            c = col.tolist()
+
+    def test_read_values_str(self):
+        for var, col in self.columns():
+            c = column_strings(var, col)
+
+    def test_modify(self):
+        data = self.data
+        with data.unlocked(data.X) if hasattr(data, "unlocked") \
+                else contextlib.nullcontext():
+            data.X[:, 0] = 42.
+
 if __name__ == '__main__':
     unittest.main()
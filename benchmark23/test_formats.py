@@ -0,0 +1,101 @@
+"""
+Loading of the same data set from different file formats.
+
+Files are written to a temporary directory and read through their full
+paths. Cold tests evict the file from the OS page cache before each load
+(with posix_fadvise, where available), so they include reading from disk;
+warm tests read a file that has just been read.
+"""
+
+import os
+import shutil
+import tempfile
+
+from timetest import *
+
+can_drop_cache = hasattr(os, "posix_fadvise")
+tmpdir = None
+
+
+def setUpModule():
+    global tmpdir
+    if not ORANGE3:
+        raise unittest.SkipTest("requires Orange 3")
+    tmpdir = tempfile.mkdtemp()
+    data = dataset("adult")
+    for suffix in (".tab", ".csv", ".pkl", ".xlsx",
+                   ".tab.gz", ".tab.xz", ".csv.gz"):
+        filename = os.path.join(tmpdir, "adult" + suffix)
+        try:
+            data.save(filename)
+        except Exception:  # unsupported format or missing writer dependency
+            continue
+        # write the file to disk now, so cold loads do not time writing it
+        write_to_disk(filename)
+
+
+def tearDownModule():
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def write_to_disk(filename):
+    """Write the file's dirty pages to disk"""
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def drop_page_cache(filename):
+    """
+    Evict the file's pages from the OS page cache; dirty pages are not
+    evicted, so the file must have been written to disk before
+    """
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+class LoadTests:
+    suffix = None
+
+    def setUp(self):
+        self.filename = os.path.join(tmpdir, "adult" + self.suffix)
+        if not os.path.exists(self.filename):
+            self.skipTest("could not write %s files" % self.suffix)
+        Orange.data.Table(self.filename)
+
+    @unittest.skipUnless(can_drop_cache, "can not drop pages from cache")
+    def test_cold(self):
+        drop_page_cache(self.filename)
+        Orange.data.Table(self.filename)
+
+    def test_warm(self):
+        Orange.data.Table(self.filename)
+
+class TestLoad_tab(LoadTests, TimeTest):
+    suffix = ".tab"
+
+class TestLoad_csv(LoadTests, TimeTest):
+    suffix = ".csv"
+
+class TestLoad_pkl(LoadTests, TimeTest):
+    suffix = ".pkl"
+
+class TestLoad_xlsx(LoadTests, TimeTest):
+    suffix = ".xlsx"
+
+class TestLoad_tab_gz(LoadTests, TimeTest):
+    suffix = ".tab.gz"
+
+class TestLoad_tab_xz(LoadTests, TimeTest):
+    suffix = ".tab.xz"
+
+class TestLoad_csv_gz(LoadTests, TimeTest):
+    suffix = ".csv.gz"
+
+if __name__ == '__main__':
+    unittest.main()
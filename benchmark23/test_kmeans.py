@@ -3,7 +3,7 @@ from timetest import *
 class TestKMeans(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("adult.tab")
+        self.data = dataset("adult.tab")
         if ORANGE3:
             continuizer = Orange.preprocess.Continuize()
             self.cl = Orange.clustering.KMeans(n_clusters=3)
@@ -8,7 +8,7 @@ else:
 class TestSimpleTree_iris(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("iris.tab")
+        self.data = dataset("iris.tab")
 
     def test_simpleTreeUse(self):
         SimpleTreeLearner()(self.data)
@@ -16,7 +16,7 @@ class TestSimpleTree_iris(TimeTest):
 class TestSimpleTree_adult(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("adult.tab")
+        self.data = dataset("adult.tab")
 
     def test_simpleTreeUse(self):
         SimpleTreeLearner()(self.data)
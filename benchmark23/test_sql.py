@@ -0,0 +1,139 @@
+"""
+Benchmarks of Orange's SQL table backend.
+
+Synthetic tables of growing size are created in the database given by
+ORANGE_TEST_DB_URI (default: postgres://postgres@localhost:5432/postgres),
+for instance in a container with the image from postgres/:
+
+    docker run -d -p 5432:5432 -e POSTGRES_HOST_AUTH_METHOD=trust orangedm/postgres:11
+
+Tables are kept between runs. Tests compare work pushed down to the database
+(sampling, quantile-based discretization) with pulling the data into memory.
+"""
+
+import io
+import os
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from timetest import *
+
+DB_URI = os.environ.get("ORANGE_TEST_DB_URI",
+                        "postgres://postgres@localhost:5432/postgres")
+COLUMNS = 10
+# budget of tsm_system_time sampling in seconds, and percentage of rows
+# sampled by sample_percentage
+SAMPLE_TIME = 0.1
+SAMPLE_PERCENTAGE = 1
+connection_params = None
+
+
+def parse_uri(uri):
+    parts = urlsplit(uri)
+    return dict(host=parts.hostname, port=parts.port or 5432,
+                database=parts.path.strip("/"),
+                user=parts.username, password=parts.password)
+
+
+def create_table(cursor, name, rows):
+    """Create a table with normally distributed columns and a binary class"""
+    cursor.execute("SELECT to_regclass(%s)", (name,))
+    if cursor.fetchone()[0] is not None:
+        cursor.execute("SELECT count(*) FROM %s" % name)
+        if cursor.fetchone()[0] == rows:
+            return
+        cursor.execute("DROP TABLE %s" % name)
+    columns = ["a%d" % i for i in range(COLUMNS)]
+    cursor.execute("CREATE TABLE %s (%s, cls varchar(3))" % (
+        name, ", ".join("%s double precision" % col for col in columns)))
+    rng = np.random.default_rng(0)
+    chunk = 100000
+    for start in range(0, rows, chunk):
+        X = rng.standard_normal((min(chunk, rows - start), COLUMNS))
+        buffer = io.StringIO()
+        for row in X:
+            buffer.write("\t".join(map(repr, row.tolist())))
+            buffer.write("\tpos\n" if row[0] > 0 else "\tneg\n")
+        buffer.seek(0)
+        cursor.copy_from(buffer, name, columns=columns + ["cls"])
+    cursor.execute("ANALYZE %s" % name)
+
+
+def setUpModule():
+    global connection_params
+    if not ORANGE3:
+        raise unittest.SkipTest("requires Orange 3")
+    try:
+        import psycopg2
+        params = parse_uri(DB_URI)
+        connection = psycopg2.connect(**params)
+    except Exception as ex:
+        raise unittest.SkipTest("no database connection: %s" % ex)
+    with connection, connection.cursor() as cursor:
+        for extension in ("quantile", "tsm_system_time"):
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS %s" % extension)
+        for cls in (TestSql_10k, TestSql_100k, TestSql_1M):
+            create_table(cursor, cls.table_name, cls.rows)
+    connection.close()
+    connection_params = params
+
+
+class SqlTests:
+    rows = table_name = None
+
+    def setUp(self):
+        from Orange.data.sql.table import SqlTable
+        self.data = SqlTable(connection_params, self.table_name,
+                             inspect_values=True)
+        self.sample = None
+
+    def tearDown(self):
+        # sampling by time returns fewer rows on slower systems, so timings
+        # are comparable only together with the number of rows
+        if self.sample is not None:
+            print("SAMPLE %s: %d of %d rows"
+                  % (self.id(), len(self.sample), self.rows))
+
+    def test_construct(self):
+        from Orange.data.sql.table import SqlTable
+        SqlTable(connection_params, self.table_name, inspect_values=True)
+
+    def test_sample_time(self):
+        self.sample = self.data.sample_time(SAMPLE_TIME, no_cache=True)
+
+    def test_sample_percentage(self):
+        self.sample = self.data.sample_percentage(SAMPLE_PERCENTAGE,
+                                                  no_cache=True)
+
+    def test_discretize(self):
+        disc = Orange.preprocess.Discretize(
+            method=Orange.preprocess.discretize.EqualFreq(n=4))
+        disc(self.data)
+
+    def test_discretize_in_memory(self):
+        disc = Orange.preprocess.Discretize(
+            method=Orange.preprocess.discretize.EqualFreq(n=4))
+        disc(Orange.data.Table(self.data))
+
+    def test_stream(self):
+        for row in self.data:
+            pass
+
+    def test_download(self):
+        Orange.data.Table(self.data)
+
+class TestSql_10k(SqlTests, TimeTest):
+    rows = 10 ** 4
+    table_name = "benchmark_%d" % rows
+
+class TestSql_100k(SqlTests, TimeTest):
+    rows = 10 ** 5
+    table_name = "benchmark_%d" % rows
+
+class TestSql_1M(SqlTests, TimeTest):
+    rows = 10 ** 6
+    table_name = "benchmark_%d" % rows
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,7 @@ else:
 class TestSVM_iris(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("iris.tab")
+        self.data = dataset("iris.tab")
 
     def test_use(self):
         SVM(self.data)
@@ -18,7 +18,7 @@ class TestSVM_iris(TimeTest):
 class TestSVM_adult_sample(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("adult_sample.tab")
+        self.data = dataset("adult_sample.tab")
 
     def test_use(self):
         SVM(self.data)
@@ -26,7 +26,7 @@ class TestSVM_adult_sample(TimeTest):
 class TestSVM_car(TimeTest):
     
     def setUp(self):
-        self.data = Orange.data.Table("car.tab")
+        self.data = dataset("car.tab")
 
     def test_use(self):
         SVM(self.data)
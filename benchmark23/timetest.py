@@ -1,33 +1,355 @@
-import unittest
+import argparse
+import atexit
+import collections
+import cProfile
+import functools
+import os
+import pickle
+import pstats
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
 import time
+import tracemalloc
+import types
+import unittest
+import numpy as np
 import Orange
 
 ORANGE3 = Orange.__version__ >= "3"
 
+# Options of the timing harness; whatever is left is passed on to unittest
+parser = argparse.ArgumentParser(add_help=False)
+parser.add_argument("--repeat", type=int, default=0,
+                    help="number of timed rounds (default: single-shot timing)")
+parser.add_argument("--warmup", type=int, default=1,
+                    help="untimed rounds before measuring")
+parser.add_argument("--min-time", type=float, default=0.2,
+                    help="minimal duration of a round in seconds; "
+                         "fast tests are called repeatedly within a round")
+parser.add_argument("--memory", action="store_true",
+                    help="in an additional untimed call, measure peak RSS and "
+                         "peak and net allocations traced by tracemalloc")
+parser.add_argument("--profile", metavar="DIR", nargs="?", const="profiles",
+                    help="in additional untimed calls, profile each test and "
+                         "write its collapsed stacks and top functions to DIR "
+                         "(default: profiles)")
+parser.add_argument("--profile-top", type=int, default=30, metavar="N",
+                    help="number of functions listed by --profile")
+parser.add_argument("--data-cache", metavar="DIR",
+                    default=os.path.join(tempfile.gettempdir(),
+                                         "orange-benchmark-data"),
+                    help="directory with snapshots of data sets used by tests; "
+                         "empty to load data sets from files (default: %(default)s)")
+parser.add_argument("--store", metavar="FILE",
+                    help="append the results to a JSON lines results store")
+OPTIONS, sys.argv[1:] = parser.parse_known_args(sys.argv[1:])
+
+# Results of tests run in this process, saved at exit if --store is given
+RESULTS = []
+
+
+@atexit.register
+def _store_results():
+    if OPTIONS.store and RESULTS:
+        import results
+        results.save_run(OPTIONS.store, RESULTS)
+
+
+# Data sets used by this process: tables or, for snapshots, their paths
+# and the parts that cannot be memory-mapped
+_datasets = {}
+
+
+def _make_snapshot(name, path):
+    """
+    Store the data set in a directory, with X and Y in .npy files
+    that can be memory-mapped; the rest (or sparse tables) is pickled.
+    """
+    data = Orange.data.Table(name)
+    os.makedirs(OPTIONS.data_cache, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=OPTIONS.data_cache)
+    if data.X.dtype == data.Y.dtype == np.float64 \
+            and isinstance(data.X, np.ndarray) and isinstance(data.Y, np.ndarray):
+        np.save(os.path.join(tmp_path, "X.npy"), data.X)
+        np.save(os.path.join(tmp_path, "Y.npy"), data.Y)
+        parts = data.domain, data.metas, data.W
+    else:
+        parts = data
+    with open(os.path.join(tmp_path, "table.pkl"), "wb") as f:
+        pickle.dump(parts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # an existing snapshot is complete (renaming is atomic) and may be in use
+    # by another process, so it is kept
+    try:
+        os.rename(tmp_path, path)
+    except OSError:  # created by another process in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _load_snapshot(name):
+    """Path to the snapshot of the data set and its pickled part"""
+    key = os.path.splitext(name)[0]
+    source = Orange.data.io.FileFormat.locate(
+        name, Orange.data.table.dataset_dirs)
+    path = os.path.join(OPTIONS.data_cache, "%s-%s-%d" % (
+        key, Orange.__version__, os.stat(source).st_mtime_ns))
+    if not os.path.exists(os.path.join(path, "table.pkl")):
+        _make_snapshot(name, path)
+    with open(os.path.join(path, "table.pkl"), "rb") as f:
+        return path, pickle.load(f)
+
+
+def dataset(name):
+    """
+    Return a data table, loaded from a file only once.
+
+    With Orange 3, the data set is kept as a snapshot in the data cache, which
+    is shared by processes and runs. X and Y are memory-mapped copy-on-write,
+    so tests can modify the table without copying it or affecting other tests.
+    Otherwise (or if the cache is disabled) the table is loaded once per
+    process and each test gets a copy.
+    """
+    key = os.path.splitext(name)[0]
+    if not ORANGE3 or not OPTIONS.data_cache:
+        if key not in _datasets:
+            _datasets[key] = Orange.data.Table(name)
+        data = _datasets[key]
+        return data.copy() if ORANGE3 else Orange.data.Table(data)
+
+    if key not in _datasets:
+        _datasets[key] = _load_snapshot(name)
+    path, parts = _datasets[key]
+    if isinstance(parts, Orange.data.Table):
+        return parts.copy()
+    domain, metas, W = parts
+    X = np.load(os.path.join(path, "X.npy"), mmap_mode="c")
+    Y = np.load(os.path.join(path, "Y.npy"), mmap_mode="c")
+    return Orange.data.Table.from_numpy(domain, X, Y, metas.copy(), W.copy())
+
+
+def time_calls(func, number):
+    """Run `func` `number` times and return the elapsed time in ns"""
+    t = time.perf_counter_ns()
+    for _ in range(number):
+        func()
+    return time.perf_counter_ns() - t
+
+
+def reset_peak_rss():
+    """
+    Reset the process's peak RSS and return True, or False if this is not
+    supported (Linux only)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss():
+    """Peak resident set size of the process since the reset, in bytes"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def memory_usage(func):
+    """
+    Peak RSS, and peak and net allocations (in bytes) during a call.
+
+    The function is called twice: tracing allocations inflates RSS, so peak
+    RSS is measured in a call without tracemalloc. Peak RSS is None where it
+    cannot be reset; the process's all-time peak may belong to earlier tests.
+    """
+    can_reset = reset_peak_rss()
+    func()
+    rss = peak_rss() if can_reset else None
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return dict(peak_rss=rss,
+                alloc_peak=peak - before, alloc_net=current - before)
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the stack of the calling thread below the frame of function `root`
+    and sum the collapsed stacks (frames joined with semicolons), each
+    weighted by the time since the previous sample in microseconds.
+
+    The sampler cannot run while the sampled thread holds the GIL (e.g. in C
+    code), so samples can be much further apart than `interval`.
+    """
+    def __init__(self, root, interval=0.001):
+        super().__init__(daemon=True)
+        self.thread_id = threading.get_ident()
+        self.root = getattr(root, "__func__", root).__code__
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.done = threading.Event()
+
+    def run(self):
+        last = time.perf_counter_ns()
+        while not self.done.wait(self.interval):
+            now = time.perf_counter_ns()
+            weight, last = (now - last) // 1000, now
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s (%s:%d)" % (code.co_name,
+                                             os.path.basename(code.co_filename),
+                                             code.co_firstlineno))
+                if code is self.root:
+                    self.stacks[";".join(reversed(stack))] += weight
+                    self.samples += 1
+                    break
+                frame = frame.f_back
+
+    def __enter__(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(self.interval)
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        self.join()
+        sys.setswitchinterval(self.switch_interval)
+
+
+def profile(func, filename, top, samples=1000, max_time=2):
+    """
+    Profile `func` with cProfile and write the top functions by cumulative
+    time to `filename`.txt; then sample its stacks and write them, weighted
+    by time in microseconds, to `filename`.collapsed, which can be used by
+    flamegraph.pl or speedscope. For the latter, `func` is called repeatedly
+    until there are `samples` samples or for at least `max_time` seconds.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(func)
+    with open(filename + ".txt", "w") as f:
+        stats = pstats.Stats(profiler, stream=f)
+        stats.sort_stats("cumulative").print_stats(top)
+    end = time.perf_counter() + max_time
+    with StackSampler(func) as sampler:
+        while True:
+            func()
+            if sampler.samples >= samples or time.perf_counter() >= end:
+                break
+    with open(filename + ".collapsed", "w") as f:
+        for stack, weight in sorted(sampler.stacks.items()):
+            f.write("%s %d\n" % (stack, weight))
+
+
+def calibrate(func, min_time):
+    """Number of calls that makes a round last at least `min_time` seconds"""
+    min_ns = min_time * 1e9
+    number = 1
+    while True:
+        elapsed = time_calls(func, number)
+        if elapsed >= min_ns:
+            return number
+        estimate = int(number * min_ns / max(elapsed, 1)) + 1
+        number = min(number * 10, max(number * 2, estimate))
+
+
+def summarize(times):
+    """Median, quartiles, minimum and Tukey's outliers of times per call"""
+    times = sorted(times)
+    if len(times) > 1:
+        q1, median, q3 = statistics.quantiles(times, n=4, method="inclusive")
+    else:
+        q1 = median = q3 = times[0]
+    iqr = q3 - q1
+    low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    return dict(median=median, q1=q1, q3=q3, iqr=iqr,
+                min=times[0], max=times[-1], rounds=len(times),
+                outliers=sum(not low <= t <= high for t in times))
+
+
+def measure(func):
+    """Time `func` as set by the options and return statistics in seconds"""
+    if not OPTIONS.repeat:
+        number = 1
+        times = [time_calls(func, 1)]
+    else:
+        number = calibrate(func, OPTIONS.min_time)
+        for _ in range(OPTIONS.warmup):
+            time_calls(func, number)
+        times = [time_calls(func, number) for _ in range(OPTIONS.repeat)]
+    stats = summarize([t / number / 1e9 for t in times])
+    stats["number"] = number
+    return stats
+
+
 class TimeTest(unittest.TestCase):
 
     def _setUp(self):
          of = object.__getattribute__(self, "setUp")
          r = None
+         self._stats = None
          if of:
              r = of()
-         self._startTime = time.time()
          return r
 
     def _tearDown(self):
-         t = time.time() - self._startTime
-         print("")
-         print("TIMING %s: %.6f" % (self.id(), t))
+         stats = self._stats
+         if stats is not None:
+             RESULTS.append(dict(id=self.id(), **stats))
+             print("")
+             print("TIMING %s: %.6f" % (self.id(), stats["median"]))
+             if stats["rounds"] > 1:
+                 print("STATS %s: median=%.6f iqr=%.6f min=%.6f "
+                       "(%d rounds x %d calls, %d outliers)"
+                       % (self.id(), stats["median"], stats["iqr"],
+                          stats["min"], stats["rounds"], stats["number"],
+                          stats["outliers"]))
+             if "alloc_peak" in stats:
+                 rss = stats["peak_rss"]
+                 print("MEMORY %s: peak rss=%s alloc peak=%.1f MB net=%.1f MB"
+                       % (self.id(),
+                          "n/a" if rss is None else "%.1f MB" % (rss / 2 ** 20),
+                          stats["alloc_peak"] / 2 ** 20,
+                          stats["alloc_net"] / 2 ** 20))
          of = object.__getattribute__(self, "tearDown")
          r = None
          if of:
              return of()
-  
+
+    def _measure(self, method):
+        @functools.wraps(method)
+        def measured(test):
+            test._stats = measure(method)
+            if OPTIONS.memory:
+                test._stats.update(memory_usage(method))
+            if OPTIONS.profile:
+                os.makedirs(OPTIONS.profile, exist_ok=True)
+                filename = os.path.join(OPTIONS.profile, test.id())
+                profile(method, filename, OPTIONS.profile_top)
+                print("\nPROFILE %s: %s.txt, %s.collapsed"
+                      % (test.id(), filename, filename))
+        # a bound method; unittest's loader takes plain functions returned
+        # by instances for static methods and calls them without self
+        return types.MethodType(measured, self)
+
     def __getattribute__(self, attr):
         if attr == "setUp":
             return self._setUp
         if attr == "tearDown":
             return self._tearDown
-        else:   
+        if attr == object.__getattribute__(self, "_testMethodName"):
+            return self._measure(object.__getattribute__(self, attr))
+        else:
             return object.__getattribute__(self, attr)
-
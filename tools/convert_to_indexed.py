@@ -0,0 +1,152 @@
+"""
+Converts PNG images to 256 colors with Floyd-Steinberg dithering, like
+convert-to-indexed.sh, but without ImageMagick and in parallel. Transparent
+pixels stay transparent. Images with semi-transparent pixels (shadows,
+antialiased edges) are quantized with alpha, which is kept in the palette's
+tRNS entries; these images are not dithered and get their own palette also
+with -s. Images whose indexed copy is newer than the image are skipped.
+
+    % python convert_to_indexed.py [-s] <path-to-folder> ...
+"""
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+try:
+    from tools.trim import indexed_image
+except ImportError:  # run as a script from the tools directory
+    from trim import indexed_image
+
+# size of image samples from which a shared palette is computed
+SAMPLE_SIZE = (512, 512)
+
+
+def has_partial_alpha(rgba):
+    """tells whether the RGBA image has pixels that are neither transparent
+    nor opaque"""
+    return any(rgba.getchannel("A").histogram()[1:255])
+
+
+def split_alpha(im):
+    """returns the RGB image and the mask of transparent pixels (or None);
+    alpha is thresholded at 128"""
+    rgba = im.convert("RGBA")
+    alpha = rgba.getchannel("A")
+    if alpha.getextrema()[0] >= 128:
+        return rgba.convert("RGB"), None
+    return rgba.convert("RGB"), alpha.point(lambda a: 255 if a < 128 else 0,
+                                            "1")
+
+
+def convert(file_path, out_path, colors, palette=None):
+    """convert the image; returns a note about it or None"""
+    with Image.open(file_path) as im:
+        rgba = im.convert("RGBA")
+    if has_partial_alpha(rgba):
+        # quantizing to a given palette (with dithering) only supports RGB
+        rgba.quantize(colors, method=Image.FASTOCTREE).save(out_path)
+        return "semi-transparent, quantized with alpha" \
+            + (" and its own palette" if palette is not None else "")
+    rgb, mask = split_alpha(rgba)
+    pal_img, transparent = indexed_image(rgb, (255, 255, 255), mask, colors,
+                                         palette)
+    if transparent is None:
+        pal_img.save(out_path)
+    else:
+        pal_img.save(out_path, transparency=transparent)
+    return None
+
+
+def shared_palette(files, colors):
+    """palette (as "P" image) computed from samples of pixels of all images;
+    one color is left for transparency"""
+    samples = []
+    for file_path in files:
+        with Image.open(file_path) as im:
+            rgb, _ = split_alpha(im)
+        # nearest neighbour keeps the original colors
+        if rgb.width > SAMPLE_SIZE[0] or rgb.height > SAMPLE_SIZE[1]:
+            rgb.thumbnail(SAMPLE_SIZE, Image.NEAREST)
+        samples.append(rgb)
+    # fill the empty area with a color that is already in the images
+    montage = Image.new("RGB", (max(im.width for im in samples),
+                                sum(im.height for im in samples)),
+                        samples[0].getpixel((0, 0)))
+    y = 0
+    for im in samples:
+        montage.paste(im, (0, y))
+        y += im.height
+    return montage.quantize(colors - 1)
+
+
+def out_of_date(file_path, out_path):
+    return not os.path.exists(out_path) \
+        or os.path.getmtime(out_path) < os.path.getmtime(file_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert png images to indexed colors.")
+    parser.add_argument("paths", nargs="+", help="folders with images")
+    parser.add_argument("-o", "--output-dir",
+                        help="directory for indexed images "
+                             "(default: indexed in each folder)")
+    parser.add_argument("-c", "--colors", type=int, default=256,
+                        help="number of colors (default: 256)")
+    parser.add_argument("-s", "--shared-palette", action="store_true",
+                        help="use the same palette for all images")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="convert images even if they are up to date")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of parallel processes "
+                             "(default: number of cores)")
+    args = parser.parse_args()
+
+    jobs = []
+    for path in args.paths:
+        out_dir = args.output_dir or os.path.join(path, "indexed")
+        for file_path in sorted(glob.glob(os.path.join(path, "*.png"))):
+            jobs.append((file_path,
+                         os.path.join(out_dir, os.path.basename(file_path))))
+    todo = [(f, out) for f, out in jobs
+            if args.force or out_of_date(f, out)]
+    if args.shared_palette and todo:
+        # a new palette changes all images
+        todo = jobs
+    if not todo:
+        print("All %d images are up to date." % len(jobs))
+        return 0
+    for out_dir in {os.path.dirname(out) for _, out in todo}:
+        os.makedirs(out_dir, exist_ok=True)
+
+    palette = None
+    if args.shared_palette:
+        print("Computing a palette from %d images ..." % len(todo))
+        palette = shared_palette([f for f, _ in todo], args.colors)
+
+    failed = []
+    with ProcessPoolExecutor(args.jobs) as executor:
+        futures = {executor.submit(convert, f, out, args.colors, palette): f
+                   for f, out in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_path = futures[future]
+            try:
+                note = future.result()
+            except Exception as ex:
+                failed.append(file_path)
+                print("[%d/%d] %s failed: %s" % (done, len(todo), file_path, ex))
+            else:
+                print("[%d/%d] %s%s" % (done, len(todo), file_path,
+                                        " (%s)" % note if note else ""))
+    print("Images indexed: %d, up to date: %d, failed: %d"
+          % (len(todo) - len(failed), len(jobs) - len(todo), len(failed)))
+    return int(bool(failed))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Lossless PNG optimizer; an offline alternative to tinify_images.py.
+
+Images are re-encoded in the smallest of the lossless representations
+(palette with the lowest bit depth, grayscale, without alpha if the image is
+opaque), PNG row filters and zlib strategies. Color-related chunks (iCCP,
+sRGB, gAMA, cHRM) and pHYs are kept, other ancillary chunks are dropped;
+images with an ICC profile or chromaticities stay color or grayscale.
+The result is decoded and compared to the original before it replaces it.
+Images with 16 bits per sample are left as they are.
+
+Hashes of processed files are kept in .optimize-png.json in the directory,
+so files are not processed again unless they change.
+
+    % python optimize_png.py -p <path_to_dir> [-j 8] [-x]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import pathlib
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+MANIFEST = ".optimize-png.json"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+KEEP_CHUNKS = {b"iCCP", b"sRGB", b"gAMA", b"cHRM", b"pHYs"}
+
+# PNG color types and their number of channels
+GRAY, RGB, PALETTE, GRAY_ALPHA, RGBA = 0, 2, 3, 4, 6
+CHANNELS = {GRAY: 1, RGB: 3, PALETTE: 1, GRAY_ALPHA: 2, RGBA: 4}
+
+ALL_FILTERS = (0, 1, 2, 3, 4, "adaptive")
+ALL_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE)
+
+
+def chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data \
+        + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def read_chunks(data):
+    """yields tags and complete chunks (with length and crc) of a png file"""
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        yield tag, data[pos:pos + length + 12]
+        pos += length + 12
+
+
+def pack_bits(indices, depth):
+    """packs rows of palette indices into `depth` bits per pixel"""
+    if depth == 8:
+        return indices
+    per_byte = 8 // depth
+    height, width = indices.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), np.uint8)
+    padded[:, :width] = indices
+    groups = padded.reshape(height, -1, per_byte)
+    shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * depth
+    return np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8)
+
+
+def representations(rgba, colors, color=None):
+    """
+    Lossless representations of an (height, width, 4) array as tuples
+    (color type, bit depth, rows of bytes, PLTE data, tRNS data).
+    `colors` are the image's RGBA colors if there are at most 256.
+    If `color` is True (False), only color (grayscale) types are used,
+    because the image's color profile is valid only for them.
+    """
+    height = rgba.shape[0]
+    opaque = bool((rgba[..., 3] == 255).all())
+    gray = color is not True \
+        and bool((rgba[..., 0] == rgba[..., 1]).all()
+                 and (rgba[..., 1] == rgba[..., 2]).all())
+    if gray and opaque:
+        yield GRAY, 8, rgba[..., 0], b"", b""
+    elif gray:
+        yield GRAY_ALPHA, 8, rgba[..., [0, 3]].reshape(height, -1), b"", b""
+    elif opaque:
+        yield RGB, 8, rgba[..., :3].reshape(height, -1), b"", b""
+    else:
+        yield RGBA, 8, rgba.reshape(height, -1), b"", b""
+
+    if colors is None or color is False:
+        return
+    # Translucent colors first, so tRNS can be shorter than the palette
+    colors = sorted(colors, key=lambda c: (c[3] == 255, c))
+    palette = np.array(colors, dtype=np.uint8)
+    packed = palette.view(np.uint32)[:, 0]
+    order = np.argsort(packed)
+    pixels = np.ascontiguousarray(rgba).view(np.uint32)[..., 0]
+    indices = order[np.searchsorted(packed[order], pixels)].astype(np.uint8)
+    depth = next(d for d in (1, 2, 4, 8) if len(colors) <= 2 ** d)
+    alphas = palette[:, 3]
+    translucent = np.flatnonzero(alphas != 255)
+    trns = alphas[:translucent[-1] + 1].tobytes() if len(translucent) else b""
+    yield PALETTE, depth, pack_bits(indices, depth), palette[:, :3].tobytes(), \
+        trns
+
+
+def filter_rows(rows, bpp):
+    """rows filtered with each of the five PNG filters, (5, height, width)"""
+    x = rows.astype(np.int16)
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    up = np.zeros_like(x)
+    up[1:] = x[:-1]
+    up_left = np.zeros_like(x)
+    up_left[1:, bpp:] = x[:-1, :-bpp]
+    p = left + up - up_left
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left,
+                     np.where(pb <= pc, up, up_left))
+    filtered = np.stack((x, x - left, x - up, x - (left + up) // 2, x - paeth))
+    return (filtered & 0xff).astype(np.uint8)
+
+
+def filtered_stream(filtered, png_filter):
+    """scanlines with filter type bytes, for a filter or adaptive choice"""
+    height = filtered.shape[1]
+    if png_filter == "adaptive":
+        # the usual heuristic: minimal sum of absolute (signed) values
+        scores = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+        types = scores.argmin(axis=0)
+        data = filtered[types, np.arange(height)]
+    else:
+        types = np.full(height, png_filter)
+        data = filtered[png_filter]
+    stream = np.empty((height, data.shape[1] + 1), np.uint8)
+    stream[:, 0] = types
+    stream[:, 1:] = data
+    return stream.tobytes()
+
+
+def encode(rgba, colors, ancillary, filters, strategies, color=None):
+    """smallest png encoding of the image"""
+    height, width = rgba.shape[:2]
+    best = None
+    for color_type, depth, rows, plte, trns in \
+            representations(rgba, colors, color):
+        bpp = max(1, CHANNELS[color_type] * depth // 8)
+        filtered = filter_rows(rows, bpp)
+        for png_filter in filters:
+            stream = filtered_stream(filtered, png_filter)
+            for strategy in strategies:
+                compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+                idat = compressor.compress(stream) + compressor.flush()
+                if best is not None and len(idat) >= len(best[0]):
+                    continue
+                header = struct.pack(">IIBBBBB", width, height, depth,
+                                     color_type, 0, 0, 0)
+                best = idat, header, plte, trns
+    idat, header, plte, trns = best
+    return b"".join((
+        PNG_SIGNATURE, chunk(b"IHDR", header), *ancillary,
+        chunk(b"PLTE", plte) if plte else b"",
+        chunk(b"tRNS", trns) if trns else b"",
+        chunk(b"IDAT", idat), chunk(b"IEND", b"")))
+
+
+def optimize(file_path, filters, strategies):
+    """optimize the file in place; returns the old and the new size"""
+    data = pathlib.Path(file_path).read_bytes()
+    # Pillow decodes 16-bit RGB(A) to 8 bits, so these can not be verified
+    if data[:len(PNG_SIGNATURE)] == PNG_SIGNATURE and data[24] == 16:
+        return len(data), len(data)
+    with Image.open(io.BytesIO(data)) as im:
+        if im.format != "PNG" or getattr(im, "is_animated", False) \
+                or im.mode not in ("1", "L", "LA", "P", "PA", "RGB", "RGBA"):
+            return len(data), len(data)
+        rgba_img = im.convert("RGBA")
+    rgba = np.asarray(rgba_img)
+    colors = rgba_img.getcolors(256)
+    if colors is not None:
+        colors = [color for _, color in colors]
+    chunks = [(tag, c) for tag, c in read_chunks(data) if tag in KEEP_CHUNKS]
+    ancillary = [c for _, c in chunks]
+    # ICC profiles and chromaticities apply to either color or grayscale
+    # images, so these images keep their kind
+    color = None
+    if any(tag in (b"iCCP", b"cHRM") for tag, _ in chunks):
+        color = bool(data[25] & 2)
+    new_data = encode(rgba, colors, ancillary, filters, strategies, color)
+    if len(new_data) >= len(data):
+        return len(data), len(data)
+    with Image.open(io.BytesIO(new_data)) as im:
+        if im.convert("RGBA").tobytes() != rgba.tobytes():
+            raise ValueError("optimized image differs from the original")
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    tmp_path.write_bytes(new_data)
+    os.replace(tmp_path, file_path)
+    return len(data), len(new_data)
+
+
+def file_hash(file_path):
+    return hashlib.sha256(pathlib.Path(file_path).read_bytes()).hexdigest()
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def optimize_images(path, jobs, exhaustive=False, force=False):
+    path = pathlib.Path(path)
+    manifest_path = path / MANIFEST
+    manifest = {} if force else load_manifest(manifest_path)
+    files = {}
+    skipped = 0
+    for file_path in sorted(path.rglob("*.png")):
+        name = file_path.relative_to(path).as_posix()
+        if manifest.get(name) == file_hash(file_path):
+            skipped += 1
+        else:
+            files[file_path] = name
+    if exhaustive:
+        filters, strategies = ALL_FILTERS, ALL_STRATEGIES
+    else:
+        filters, strategies = (0, "adaptive"), ALL_STRATEGIES[:2]
+
+    total_old = total_new = 0
+    failed = []
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = {executor.submit(optimize, file_path, filters, strategies):
+                   file_path for file_path in files}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                old_size, new_size = future.result()
+            except Exception as ex:
+                failed.append(file_path)
+                print(f"{file_path}: failed ({ex})")
+                continue
+            total_old += old_size
+            total_new += new_size
+            manifest[files[file_path]] = file_hash(file_path)
+            print(f"{file_path}: {old_size} -> {new_size} bytes "
+                  f"(saved {old_size - new_size}, "
+                  f"{(old_size - new_size) / old_size:.1%})")
+    if files:
+        save_manifest(manifest_path, manifest)
+    print(f"Optimized {len(files) - len(failed)} images, "
+          f"skipped {skipped} optimized before; "
+          f"saved {total_old - total_new} of {total_old} bytes")
+    return int(bool(failed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Optimize png images.")
+
+    parser.add_argument('-p', '--path', type=str, required=True,
+                        help='The directory to search.')
+
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of parallel processes.')
+
+    parser.add_argument('-x', '--exhaustive', action='store_true',
+                        help='Try all filters and zlib strategies.')
+
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Also process images that were optimized before.')
+
+    args = parser.parse_args()
+
+    sys.exit(optimize_images(args.path, args.jobs, args.exhaustive, args.force))
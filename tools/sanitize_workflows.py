@@ -0,0 +1,242 @@
+"""
+Removes recent files, URLs, window geometry and large settings from
+workflows.
+
+Workflows (.ows) in the given directories are processed in parallel. All
+settings (<properties> elements) are decoded, but only those that change are
+encoded again; the rest of the file is copied as it is. Files are replaced
+atomically.
+
+Rules:
+
+recent-paths
+    recent paths except the first (unless the widget loads from a URL) and
+    files from /datasets/ that are shipped with Orange
+urls
+    recent URLs except the first (if the widget loads from a URL)
+geometry
+    saved window geometry
+large
+    settings whose encoded size exceeds --max-size; widgets use default
+    values instead
+
+    % python sanitize_workflows.py workflows/ -r recent-paths urls geometry
+"""
+
+import argparse
+import ast
+import base64
+import os
+import pathlib
+import pickle
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.sax.saxutils import escape, unescape
+
+DEFAULTS = {f"{d}.tab" for d in (
+    "iris", "brown-selected", "housing", "titanic", "heart_disease", "zoo")}
+
+PROPERTIES = re.compile(r"<properties\b([^>]*)>(.*?)</properties>", re.S)
+NODE = re.compile(r"<node\b([^>]*?)/?>")
+ATTRIBUTE = re.compile(r'([\w:]+)="([^"]*)"')
+
+
+def attributes(text):
+    return {name: unescape(value, {"&quot;": '"'})
+            for name, value in ATTRIBUTE.findall(text)}
+
+
+def loads_from_url(values):
+    # File widget's source is 0 for files and 1 for URLs
+    return bool(values.get("source", 0))
+
+
+def remove_recent_paths(values, max_size):
+    changes = []
+    keep_url = loads_from_url(values)
+    for key, value in list(values.items()):
+        if not isinstance(value, list) \
+                or not any(type(path).__name__ == "RecentPath"
+                           for path in value):
+            continue
+        new_list = [
+            path for i, path in enumerate(value)
+            if not keep_url and i == 0
+            or type(path).__name__ != "RecentPath"
+            or path.abspath.split("/")[-2:-1] == ["datasets"]
+            and path.abspath.split("/")[-1] in DEFAULTS]
+        if len(new_list) != len(value):
+            values[key] = new_list
+            changes.append(f"removed {len(value) - len(new_list)} files")
+    return changes
+
+
+def remove_urls(values, max_size):
+    value = values.get("recent_urls")
+    keep = int(loads_from_url(values))
+    if isinstance(value, list) and len(value) > keep:
+        values["recent_urls"] = value[:keep]
+        return [f"removed {len(value) - keep} URLs"]
+    return []
+
+
+def remove_geometry(values, max_size):
+    if values.get("savedWidgetGeometry") is not None:
+        del values["savedWidgetGeometry"]
+        return ["removed window geometry"]
+    return []
+
+
+def remove_large(values, max_size):
+    changes = []
+    for key, value in list(values.items()):
+        if key == "__version__":
+            continue
+        size = len(pickle.dumps(value))
+        if size > max_size:
+            del values[key]
+            changes.append(f"removed {key} ({size} bytes)")
+    return changes
+
+
+RULES = {
+    "recent-paths": remove_recent_paths,
+    "urls": remove_urls,
+    "geometry": remove_geometry,
+    "large": remove_large,
+}
+
+
+def decode(format, text):
+    if format == "pickle":
+        return pickle.loads(base64.b64decode(text))
+    elif format == "literal":
+        return ast.literal_eval(unescape(text, {"&quot;": '"', "&apos;": "'"}))
+    raise ValueError(f"unsupported settings format ({format})")
+
+
+def encode(format, values):
+    if format == "pickle":
+        return base64.b64encode(pickle.dumps(values)).decode("ascii")
+    return escape(repr(values))
+
+
+def sanitize(text, rules, max_size):
+    """
+    Return the sanitized workflow and a list of messages about changes.
+    Only <properties> that change are rewritten.
+    """
+    names = {}
+    for match in NODE.finditer(text):
+        attrs = attributes(match.group(1))
+        names[attrs.get("id")] = attrs.get("title") or attrs.get("name")
+
+    parts = []
+    pos = 0
+    messages = []
+    for match in PROPERTIES.finditer(text):
+        attrs = attributes(match.group(1))
+        name = names.get(attrs.get("node_id"), attrs.get("node_id"))
+        try:
+            values = decode(attrs.get("format"), match.group(2))
+        except Exception as ex:
+            messages.append(f"{name}: skipped, can not decode settings ({ex})")
+            continue
+        changes = [change for rule in rules
+                   for change in RULES[rule](values, max_size)]
+        if not changes:
+            continue
+        messages += [f"{name}: {change}" for change in changes]
+        parts += [text[pos:match.start(2)],
+                  encode(attrs.get("format"), values)]
+        pos = match.end(2)
+    parts.append(text[pos:])
+    return "".join(parts), messages
+
+
+def sanitize_file(file_path, rules, max_size, dry_run=False, backup=False):
+    """
+    Sanitize the workflow; return the old and new size, whether it changed
+    and messages
+    """
+    # newline="" keeps line endings, so unchanged parts are copied as they are
+    with open(file_path, encoding="utf-8", newline="") as f:
+        text = f.read()
+    new_text, messages = sanitize(text, rules, max_size)
+    old_size = os.stat(file_path).st_size
+    new_size = len(new_text.encode("utf-8"))
+    changed = new_text != text
+    if changed and not dry_run:
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(new_text)
+        if backup:
+            shutil.copy2(file_path, file_path.with_name(file_path.name + ".bak"))
+        os.replace(tmp_path, file_path)
+    return old_size, new_size, changed, messages
+
+
+def find_workflows(paths):
+    files = []
+    for path in map(pathlib.Path, paths):
+        files += [path] if path.is_file() else sorted(path.rglob("*.ows"))
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Remove recent files, URLs, geometry and large settings "
+                    "from workflows.")
+    parser.add_argument("paths", nargs="+",
+                        help="workflows or directories (searched recursively)")
+    parser.add_argument("-r", "--rules", nargs="+", choices=list(RULES),
+                        default=["recent-paths", "urls"],
+                        help="what to remove (default: recent-paths urls)")
+    parser.add_argument("-s", "--max-size", type=int, default=1000000,
+                        help="size of settings removed by rule 'large' "
+                             "(default: 1000000 bytes)")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="report changes without writing them")
+    parser.add_argument("-b", "--backup", action="store_true",
+                        help="keep the original as <workflow>.bak")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of parallel processes "
+                             "(default: number of cores)")
+    args = parser.parse_args(argv)
+
+    files = find_workflows(args.paths)
+    total_old = total_new = 0
+    changed = []
+    failed = []
+    with ProcessPoolExecutor(args.jobs) as executor:
+        futures = {executor.submit(sanitize_file, file_path, args.rules,
+                                   args.max_size, args.dry_run, args.backup):
+                   file_path for file_path in files}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                old_size, new_size, was_changed, messages = future.result()
+            except Exception as ex:
+                failed.append(file_path)
+                print(f"{file_path}: failed ({ex})")
+                continue
+            total_old += old_size
+            total_new += new_size
+            if was_changed:
+                changed.append(file_path)
+            if messages:
+                print(f"{file_path}: {old_size} -> {new_size} bytes "
+                      f"(saved {old_size - new_size})")
+                for message in messages:
+                    print(f"    {message}")
+    print(f"Workflows changed: {len(changed)}, unchanged: "
+          f"{len(files) - len(changed) - len(failed)}, failed: {len(failed)}; "
+          f"saved {total_old - total_new} of {total_old} bytes"
+          + (" (dry run)" if args.dry_run else ""))
+    return int(bool(failed))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
+import ast
+import functools
 import shutil
 import sys
-from xml.dom import minidom
+from xml.etree.ElementTree import iterparse
 import base64
 import pickle
+import pickletools
 from pprint import pformat
 
 IGNORE = {"savedWidgetGeometry", "controlAreaVisible", "context_settings"}
@@ -12,64 +15,207 @@ try:
 except ImportError:
     print("Orange is not installed in this environment")
 
+def iter_elements(fname, tags):
+    """
+    Stream complete elements with the given tags from the workflow.
+
+    Elements are cleared after the consumer is done with them, so the
+    (possibly large) settings of only one widget are in memory at a time.
+    """
+    for _, elem in iterparse(fname):
+        if elem.tag in tags:
+            yield elem
+            elem.clear()
+
+
+def pickled_sizes(data):
+    """
+    Keys of a pickled dict and sizes of the pickles of their values, read
+    from pickle opcodes without unpickling.
+
+    A value's opcodes may refer to objects memoized before it (e.g. strings
+    that are also keys); their size is counted instead of the reference's,
+    so sizes match those of values pickled alone up to the lengths of memo
+    indices and frame headers.
+    """
+    ops = list(pickletools.genops(data))
+    proto = ops[0][1] if ops and ops[0][0].name == "PROTO" else 0
+    mark = object()
+    # (start position, value, memo index) of objects on the stack, or mark
+    stack = []
+    memo = {}  # memo index -> [start position, value, end position]
+    refs = []  # (position, size of the object - size of the reference, start)
+    sizes = {}
+    ends = [pos for _, _, pos in ops[1:]] + [len(data)]
+    for (op, arg, pos), end in zip(ops, ends):
+        before, after = op.stack_before, op.stack_after
+        if op.name in ("PUT", "BINPUT", "LONG_BINPUT"):
+            # like MEMOIZE, PUTs memoize the object on the top of the stack
+            before = after = [pickletools.anyobject]
+        items = []
+        if pickletools.markobject in before:
+            at = len(stack) - stack[::-1].index(mark) - 1
+            items = stack[at + 1:]
+            del stack[at:]
+            before = before[:before.index(pickletools.markobject)]
+        popped = stack[len(stack) - len(before):] if before else []
+        del stack[len(stack) - len(popped):]
+        if op.name in ("SETITEM", "SETITEMS") and not stack:
+            # items of the top-level dict; a value ends where the next begins
+            pairs = popped[1:] + items
+            starts = [pair[0] for pair in pairs[1:]] + [pos]
+            for i in range(0, len(pairs), 2):
+                start, stop = pairs[i + 1][0], starts[i + 1]
+                size = stop - start + sum(
+                    extra for at, extra, since in refs
+                    if start <= at < stop and since < start)
+                size += 1  # STOP
+                if proto >= 4 and size >= 4:
+                    size += 9  # FRAME
+                sizes[pairs[i][1]] = size + (2 if proto >= 2 else 0)  # PROTO
+        # a new object starts with the first of the objects it is built from;
+        # MEMOIZE and PUTs keep the value (the key's string) of the object
+        consumed = popped + items
+        start, value, index = consumed[0] if consumed else (pos, arg, None)
+        if op.name in ("MEMOIZE", "PUT", "BINPUT", "LONG_BINPUT"):
+            index = len(memo) if op.name == "MEMOIZE" else arg
+            memo[index] = [start, value, end]
+        elif op.name in ("GET", "BINGET", "LONG_BINGET"):
+            start, value, memo_end = memo[arg]
+            refs.append((pos, memo_end - start - (end - pos), start))
+            start, index = pos, None
+        elif op.name in ("APPEND", "APPENDS", "SETITEM", "SETITEMS",
+                         "ADDITEMS", "BUILD"):
+            # memoized containers end with the last opcode that fills them
+            if index is not None:
+                memo[index][2] = end
+        else:
+            index = None
+        for obj in after:
+            stack.append(mark if obj is pickletools.markobject
+                         else (start, value, index))
+    return sizes
+
+
+def literal_sizes(text):
+    """Keys of a dict literal and lengths of their values' source"""
+    tree = ast.parse(text.strip(), mode="eval").body
+    return {ast.literal_eval(key): len(ast.get_source_segment(text.strip(), value))
+            for key, value in zip(tree.keys, tree.values)}
+
+
+class Settings:
+    """Settings of a widget; they are decoded at first use of `values`"""
+
+    def __init__(self, format, text):
+        self.format = format
+        self.text = text
+
+    @functools.cached_property
+    def values(self):
+        if self.format == "pickle":
+            return pickle.loads(base64.b64decode(self.text))
+        elif self.format == "literal":
+            return eval(self.text)
+        raise ValueError(f"Unsupported settings format ({self.format})")
+
+    def sizes(self):
+        """Keys and sizes of encoded values, without unpickling them"""
+        if self.format == "pickle":
+            return pickled_sizes(base64.b64decode(self.text))
+        elif self.format == "literal":
+            return literal_sizes(self.text)
+        raise ValueError(f"Unsupported settings format ({self.format})")
+
+
+def select_widgets(node_names, op):
+    """Ids of widgets with the given number or whose name contains `op`"""
+    if op is None:
+        return set(node_names)
+    if op.isdigit():
+        return {wid for wid in node_names if int(wid) == int(op)}
+    return {wid for wid, (name, qualified) in node_names.items()
+            if op in name.lower() or op in qualified.lower()}
+
+
+def print_values(values):
+    for name, value in values.items():
+        if name in IGNORE:
+            continue
+        if not isinstance(value, (int, float, bool, str, list, dict, type(None))):
+            valtype = f" ({type(value)})"
+        else:
+            valtype = ""
+        print(f"{name}{valtype}:", end=" " if not value or isinstance(value, (int, float, bool, str)) else "\n  ")
+        print(pformat(value).replace("\n", "\n  "))
+    contexts = values.get("context_settings")
+    if contexts is not None:
+        print("Contexts:")
+        for ctx, context in enumerate(contexts):
+            print(f"{ctx:<2}: " + pformat(context.__dict__).replace("\n", "\n    "))
+
+
+def print_sizes(sizes):
+    for name, size in sizes.items():
+        print(f"{name}: {size} bytes")
+
+
 def main():
-    if len(sys.argv) <= 1:
+    args = sys.argv[1:]
+    show_sizes = "--sizes" in args
+    if show_sizes:
+        args.remove("--sizes")
+    if not args:
         print("""
-show-workflow <file.ows> [--list | widget-type or number]
+show-workflow <file.ows> [--list | widget-type or number] [--sizes]
 
 Show workflow settings for all or selected widget(s).
 
 --list prints widget names and exits
+--sizes prints only names and sizes of (encoded) settings, without decoding
 """)
-    exit()
-
-    fname = sys.argv[1]
-    op = (sys.argv + [None])[2]
-    wf = minidom.parse(fname)
-    node_names = {
-        n.getAttribute("id"): (n.getAttribute("name"), n.getAttribute("qualified_name"))
-        for n in wf.getElementsByTagName("node")}
-
-    if op == "--list":
-        for wid, (name, qname) in node_names.items():
-            print(f"{wid:2}: {name} ({qname})")
         exit()
-    elif op:
+
+    fname = args[0]
+    op = (args + [None])[1]
+    if op and op != "--list":
         op = op.lower()
 
-    for props in wf.getElementsByTagName("properties"):
-        wid = props.getAttribute("node_id")
-        name, qualified = node_names[wid]
-        if op is not None and not (
-                int(wid) == int(op) if op.isdigit()
-                else op in name.lower() or op in qualified.lower()):
+    # nodes precede settings in .ows, so widgets are selected before
+    # any settings are read
+    node_names = {}
+    selected = set()
+    for elem in iter_elements(fname, ("node", "nodes", "properties")):
+        if elem.tag == "node":
+            node_names[elem.get("id")] = \
+                (elem.get("name"), elem.get("qualified_name"))
+            continue
+        if elem.tag == "nodes":
+            if op == "--list":
+                for wid, (name, qname) in node_names.items():
+                    print(f"{wid:2}: {name} ({qname})")
+                exit()
+            selected = select_widgets(node_names, op)
+            continue
+
+        wid = elem.get("node_id")
+        if wid not in selected:
             continue
+        selected.remove(wid)
+        name, qualified = node_names[wid]
         s = f"{wid} {name} ({qualified})"
         print(s + "\n" + "-" * len(s))
-        format = props.getAttribute("format")
-        child = props.firstChild
-        if format == "pickle":
-            values = pickle.loads(base64.b64decode(child.nodeValue))
-        elif format == "literal":
-            values = eval(child.nodeValue)
-        else:
-            print(f"Unsupported settings format ({format})")
-
-        for name, value in values.items():
-            if name in IGNORE:
-                continue
-            if not isinstance(value, (int, float, bool, str, list, dict, type(None))):
-                valtype = f" ({type(value)})"
+        settings = Settings(elem.get("format"), elem.text)
+        try:
+            if show_sizes:
+                print_sizes(settings.sizes())
             else:
-                valtype = ""
-            print(f"{name}{valtype}:", end=" " if not value or isinstance(value, (int, float, bool, str)) else "\n  ")
-            print(pformat(value).replace("\n", "\n  "))
-        contexts = values.get("context_settings")
-        if contexts is not None:
-            print("Contexts:")
-            for ctx, context in enumerate(contexts):
-                print(f"{ctx:<2}: " + pformat(context.__dict__).replace("\n", "\n    "))
+                print_values(settings.values)
+        except ValueError as ex:
+            print(ex)
         print()
+        if not selected:
+            break
 
 if __name__ == "__main__":
     main()
@@ -4,14 +4,16 @@
 from __future__ import print_function, division
 
 import sys
+import argparse
 import functools
+import glob
+import hashlib
+import json
 import os.path
-import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
-from AnyQt.QtCore import (
-    QPoint, QPointF, Qt, QRectF, QBuffer, QByteArray, QIODevice
-)
+from AnyQt.QtCore import QPoint, QPointF, Qt, QRectF
 
 from AnyQt.QtWidgets import (
     QApplication, QDialog, QFileDialog, QGraphicsItem, QGraphicsScene,
@@ -19,7 +21,7 @@ from AnyQt.QtWidgets import (
     QPushButton, QVBoxLayout, QSizePolicy
 )
 
-from AnyQt.QtGui import (QCursor, QTransform, QPainter, QPixmap)
+from AnyQt.QtGui import (QCursor, QImage, QTransform, QPainter, QPixmap)
 
 from AnyQt.QtSvg import QSvgRenderer
 
@@ -66,6 +68,10 @@ STAMP_SVG = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
 </svg>
 """
 STAMP_SIZE = 20
+STAMP_CACHE_SIZE = 256
+
+# hashes of inputs of images stamped in batch mode, in each folder
+MANIFEST = ".stamper.json"
 
 
 class GraphicsView(QGraphicsView):
@@ -119,8 +125,19 @@ class GraphicsView(QGraphicsView):
         Dirty = True
 
 
-def save_png(filename, xy, pixelRatio=1):
-    print("Saving to %s-%s.png ..." % (filename, NUM))
+def qimage_to_pil(img):
+    """Copy the pixels of QImage into an RGBA PIL image (without encoding)"""
+    img = img.convertToFormat(QImage.Format_RGBA8888)
+    ptr = img.constBits()
+    if hasattr(ptr, "setsize"):  # PyQt's sip.voidptr; PySide gives a memoryview
+        ptr.setsize(img.bytesPerLine() * img.height())
+    return Image.frombuffer("RGBA", (img.width(), img.height()), bytes(ptr),
+                            "raw", "RGBA", img.bytesPerLine(), 1)
+
+
+def save_png(filename, xy, pixelRatio=1, verbose=True):
+    if verbose:
+        print("Saving to %s-%s.png ..." % (filename, NUM))
     if os.path.exists("%s-%s.png" % (filename, ORG)):
         background = Image.open("%s-%s.png" % (filename, ORG))
     else:
@@ -131,22 +148,14 @@ def save_png(filename, xy, pixelRatio=1):
         x = int(x*pixelRatio)
         y = int(y*pixelRatio)
 
-        pm = ith_stamp_pixmap(i, int(STAMP_SIZE*pixelRatio), int(STAMP_SIZE*pixelRatio))
-
-        byte_array = QByteArray()
-        buffer = QBuffer(byte_array)
-        buffer.open(QIODevice.WriteOnly)
-        pm.save(buffer, 'PNG')
-
-        string_io = io.BytesIO(buffer.data())
-        overlay = Image.open(string_io)
-
+        overlay = qimage_to_pil(ith_stamp_image(i, STAMP_SIZE, pixelRatio))
         background.paste(overlay, (int(x + overlay.size[0]//2),
                                      int(y + overlay.size[1]//2)),
                          overlay)
     background.save(os.path.splitext(filename)[0] + "-" + NUM + ".png",
                     dpi=background.info.get("dpi", (72, 72)))
-    print("done.")
+    if verbose:
+        print("done.")
 
 
 class MainForm(QDialog):
@@ -283,18 +292,26 @@ class MainForm(QDialog):
             global Dirty; Dirty = True
 
 
-def svg_to_pixmap(svg_str, width, height):
+def svg_to_image(svg_str, width, height):
     renderer = QSvgRenderer(svg_str.encode("utf8"))
-    pm = QPixmap(width, height)
-    pm.fill(Qt.GlobalColor.transparent)
-    painter = QPainter(pm)
-    renderer.render(painter, QRectF(pm.rect()))
+    img = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    img.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(img)
+    renderer.render(painter, QRectF(img.rect()))
     painter.end()
-    return pm
+    return img
+
+
+# Rendered stamps, keyed by (number, size, pixel ratio); the least recently
+# used are dropped. Images are shared between callers and must not be painted on.
+@functools.lru_cache(maxsize=STAMP_CACHE_SIZE)
+def ith_stamp_image(i, size, pixelRatio=1):
+    side = int(size * pixelRatio)
+    return svg_to_image(STAMP_SVG.replace("NUMBER", str(i + 1)), side, side)
 
 
-def ith_stamp_pixmap(i, width, height):
-    return svg_to_pixmap(STAMP_SVG.replace("NUMBER", str(i + 1)), width, height)
+def ith_stamp_pixmap(i, size, pixelRatio=1):
+    return QPixmap.fromImage(ith_stamp_image(i, size, pixelRatio))
 
 
 class StampItem(QGraphicsPixmapItem):
@@ -314,7 +331,7 @@ class StampItem(QGraphicsPixmapItem):
 
     def setStamp(self, stamp):
         self.stamp = stamp
-        pm = ith_stamp_pixmap(self.stamp, STAMP_SIZE, STAMP_SIZE)
+        pm = ith_stamp_pixmap(self.stamp, STAMP_SIZE)
         self.setPixmap(pm)
         
     def parentWidget(self):
@@ -349,6 +366,130 @@ class StampItem(QGraphicsPixmapItem):
         pass
 
 
+def read_tags(info_name):
+    """Positions of stamps, in the order in which they are numbered, as
+    passed to save_png"""
+    with open(info_name, "rt") as f:
+        vals = sorted(tuple(map(int, line.strip().split("\t")))
+                      for line in f if line.strip())
+    return [(x-STAMP_SIZE/2, y-STAMP_SIZE/2) for _, x, y in vals]
+
+
+def find_pairs(paths):
+    """Base names (without suffixes) of images that have tags"""
+    names = []
+    for path in paths:
+        for info_name in sorted(glob.glob(
+                os.path.join(path, "**", "*-%s.txt" % TAG), recursive=True)):
+            name = info_name[:-len(TAG) - 5]
+            if os.path.exists("%s-%s.png" % (name, ORG)) \
+                    or os.path.exists(name + ".png"):
+                names.append(name)
+    return names
+
+
+def stamp_key(name, pixelRatio):
+    """Hash of inputs, the stamp and its size"""
+    h = hashlib.sha256()
+    image = "%s-%s.png" % (name, ORG)
+    if not os.path.exists(image):
+        image = name + ".png"
+    for file_name in (image, "%s-%s.txt" % (name, TAG)):
+        with open(file_name, "rb") as f:
+            h.update(f.read())
+    h.update(("%s\n%s\n%s" % (STAMP_SVG, STAMP_SIZE, pixelRatio)).encode())
+    return h.hexdigest()
+
+
+def guess_pixel_ratio(name):
+    """Screenshots from high-DPI screens are saved with 144 (or more) dpi"""
+    image = "%s-%s.png" % (name, ORG)
+    if not os.path.exists(image):
+        image = name + ".png"
+    with Image.open(image) as im:
+        dpi = im.info.get("dpi", (72, 72))[0]
+    return max(1, round(dpi / 72))
+
+
+def init_batch_worker():
+    # Rendering text needs an application; no window is ever shown
+    global batch_app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    batch_app = QApplication(["stamper"])
+
+
+def stamp_file(name, pixelRatio):
+    save_png(name, read_tags("%s-%s.txt" % (name, TAG)), pixelRatio,
+             verbose=False)
+
+
+def batch(argv):
+    parser = argparse.ArgumentParser(
+        prog="stamper.py --batch",
+        description="Re-render stamped images from -%s.txt files." % TAG)
+    parser.add_argument("paths", nargs="+",
+                        help="directories (searched recursively)")
+    parser.add_argument("-r", "--pixel-ratio", type=float,
+                        help="device pixel ratio of screenshots "
+                             "(default: guessed from the image's dpi)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="render also images whose inputs did not change")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of parallel processes "
+                             "(default: number of cores)")
+    args = parser.parse_args(argv)
+
+    names = find_pairs(args.paths)
+    manifests = {}
+    todo = []
+    for name in names:
+        directory = os.path.dirname(name)
+        if directory not in manifests:
+            manifests[directory] = load_manifest(directory)
+        pixelRatio = args.pixel_ratio or guess_pixel_ratio(name)
+        key = stamp_key(name, pixelRatio)
+        if args.force \
+                or manifests[directory].get(os.path.basename(name)) != key \
+                or not os.path.exists("%s-%s.png" % (name, NUM)):
+            todo.append((name, pixelRatio, key))
+
+    failed = []
+    with ProcessPoolExecutor(args.jobs,
+                             initializer=init_batch_worker) as executor:
+        futures = {executor.submit(stamp_file, name, pixelRatio): (name, key)
+                   for name, pixelRatio, key in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name, key = futures[future]
+            try:
+                future.result()
+            except Exception as ex:
+                failed.append(name)
+                print("[%d/%d] %s failed: %s" % (done, len(todo), name, ex))
+                continue
+            print("[%d/%d] %s-%s.png" % (done, len(todo), name, NUM))
+            directory = os.path.dirname(name)
+            manifests[directory][os.path.basename(name)] = key
+            save_manifest(directory, manifests[directory])
+    print("Images stamped: %d, up to date: %d, failed: %d"
+          % (len(todo) - len(failed), len(names) - len(todo), len(failed)))
+    return int(bool(failed))
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
 def usage(argv):
     print("%s filename" % argv[0])
     print("  Helps stamp PNG files with numbered labels, ")
@@ -359,12 +500,19 @@ def usage(argv):
           (TAG, NUM))
     print()
     print("Example:")
-    print("% python %s File.png")
+    print("%% python %s File.png" % argv[0])
     print()
     print("Files and extensions:")
     print("*-%s.png  input image file" % ORG)
     print("*-%s.png  tagged image file" % NUM)
     print("*-%s.txt  coordinates of tags" % TAG)
+    print()
+    print("Batch mode (no windows):")
+    print("%% python %s --batch [-j N] [-f] [-r ratio] folder ..." % argv[0])
+    print("  re-renders *-%s.png of all images with *-%s.txt in the folders;"
+          % (NUM, TAG))
+    print("  images whose inputs, stamp and stamp size did not change since")
+    print("  the last run (see %s in each folder) are skipped" % MANIFEST)
 
 
 def main(argv=sys.argv):
@@ -374,6 +522,8 @@ def main(argv=sys.argv):
         if argv[1] in ["-h", "--help"]:
             usage(argv)
             return 0
+        elif argv[1] == "--batch":
+            return batch(argv[2:])
         else:
             filename = argv[1]
     
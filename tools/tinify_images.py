@@ -1,17 +1,168 @@
+"""
+Compresses images with the TinyPNG API.
+
+Images are uploaded by several threads at once; failed uploads are retried
+with exponential backoff. Hashes of compressed images are kept in
+.tinify.json in each directory, so a rerun (also after an interruption)
+only uploads new or changed images.
+
+    % python tinify_images.py -k <your_api_key> -p <path_to_dir> [-j 4]
+
+With --api-url, images are sent to a different server that implements the
+TinyPNG HTTP API (e.g. a local stand-in for testing).
+"""
+
 import argparse
+import base64
+import hashlib
+import json
+import os
 import pathlib
-import tinify
+import random
+import sys
 import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import tinify
+except ImportError:  # only needed for TinifyClient
+    tinify = None
+
+MANIFEST = ".tinify.json"
+
+
+class TinifyClient:
+    """Compresses images with the official tinify library"""
+
+    def __init__(self, key):
+        if tinify is None:
+            raise RuntimeError("tinify is not installed (pip install tinify)")
+        tinify.key = key
+
+    def compress(self, data):
+        return tinify.from_buffer(data).to_buffer()
+
+    def is_retryable(self, ex):
+        # AccountError is also raised when requests are rate limited
+        return isinstance(ex, (tinify.ServerError, tinify.ConnectionError)) \
+            or isinstance(ex, tinify.AccountError) \
+            and getattr(ex, "status", None) == 429
+
+
+class HttpClient:
+    """
+    Compresses images with plain HTTP requests to a server implementing the
+    TinyPNG API: POST the image to /shrink, then GET the Location of the
+    result.
+    """
+
+    def __init__(self, key, api_url, timeout=60):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        credentials = base64.b64encode(f"api:{key}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {credentials}"}
 
+    def request(self, url, data=None):
+        request = urllib.request.Request(url, data, self.headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.headers.get("Location"), response.read()
 
-def tinify_images(path, extensions):
+    def compress(self, data):
+        location, _ = self.request(self.api_url + "/shrink", data)
+        _, result = self.request(urllib.parse.urljoin(self.api_url, location))
+        return result
 
-    for file_path in [file for file in pathlib.Path(path).rglob('*')]:
-        if file_path.suffix in extensions:
-            print(f'Compressing image {file_path}')
-            source = tinify.from_file(file_path)
-            source.to_file(file_path)
-            time.sleep(0.1)
+    def is_retryable(self, ex):
+        if isinstance(ex, urllib.error.HTTPError):
+            return ex.code == 429 or ex.code >= 500
+        return isinstance(ex, (urllib.error.URLError, OSError))
+
+
+def compress_file(client, file_path, retries=5, backoff=1):
+    """
+    Compress the file in place and return the old and the new size.
+    The file is kept if the compressed image is not smaller.
+    """
+    data = file_path.read_bytes()
+    for attempt in range(retries + 1):
+        try:
+            result = client.compress(data)
+            break
+        except Exception as ex:
+            if attempt == retries or not client.is_retryable(ex):
+                raise
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+    if len(result) < len(data):
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
+        tmp_path.write_bytes(result)
+        os.replace(tmp_path, file_path)
+    return len(data), min(len(data), len(result))
+
+
+def file_hash(file_path):
+    return hashlib.sha256(pathlib.Path(file_path).read_bytes()).hexdigest()
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def tinify_images(path, extensions, client, jobs=4, force=False):
+    # manifests of directories, keyed by file names
+    manifests = {}
+    files = []
+    skipped = 0
+    for file_path in sorted(pathlib.Path(path).rglob('*')):
+        if file_path.suffix not in extensions or not file_path.is_file():
+            continue
+        directory = file_path.parent
+        if directory not in manifests:
+            manifests[directory] = \
+                {} if force else load_manifest(directory / MANIFEST)
+        if manifests[directory].get(file_path.name) == file_hash(file_path):
+            skipped += 1
+        else:
+            files.append(file_path)
+
+    total_old = total_new = 0
+    failed = []
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = {executor.submit(compress_file, client, file_path): file_path
+                   for file_path in files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_path = futures[future]
+            try:
+                old_size, new_size = future.result()
+            except Exception as ex:
+                failed.append(file_path)
+                print(f'[{done}/{len(files)}] {file_path} failed: {ex}')
+                continue
+            total_old += old_size
+            total_new += new_size
+            print(f'[{done}/{len(files)}] {file_path}: '
+                  f'{old_size} -> {new_size} bytes')
+            # save after each image, so an interrupted run can be resumed
+            directory = file_path.parent
+            manifests[directory][file_path.name] = file_hash(file_path)
+            save_manifest(directory / MANIFEST, manifests[directory])
+    print(f'Compressed {len(files) - len(failed)} images, '
+          f'skipped {skipped} compressed before, failed {len(failed)}; '
+          f'saved {total_old - total_new} of {total_old} bytes')
+    return int(bool(failed))
 
 
 if __name__ == '__main__':
@@ -27,7 +178,22 @@ if __name__ == '__main__':
                         default=['.png', '.jpg'],
                         help='The file extensions to search for.')
 
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Number of concurrent uploads.')
+
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Also compress images that were compressed '
+                             'before.')
+
+    parser.add_argument('--api-url', type=str,
+                        help='URL of a server implementing the TinyPNG API '
+                             '(default: use the tinify library).')
+
     args = parser.parse_args()
 
-    tinify.key = args.key
-    tinify_images(args.path, args.extensions)
+    if args.api_url:
+        client = HttpClient(args.key, args.api_url)
+    else:
+        client = TinifyClient(args.key)
+    sys.exit(tinify_images(args.path, args.extensions, client, args.jobs,
+                           args.force))
@@ -4,12 +4,28 @@ Ver 1.0: July 2010
 """
 
 import argparse
-from PIL import Image, ImageChops, ImageFilter
+import contextlib
+import glob
+import hashlib
+import io
+import json
 import os.path
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image, ImageChops, ImageFilter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # thumbnail_size = (180, 180)
 thumbnail_size = (555, 1000)
 
+# file in the output directory with hashes and options of processed files
+MANIFEST = ".trimshot.json"
+
 
 def rgb_color_finder(rgb_img, color_min=(0, 0, 0), color_max=(255, 255, 255),
                      all_bands=1, r_mode='1'):
@@ -69,46 +85,301 @@ def get_bbox(im, border):
     return bbox
 
 
-def process(file_path, args):
+def rgb_color_finder_array(rgb_arr, color_min=(0, 0, 0),
+                           color_max=(255, 255, 255), all_bands=1):
+    """NumPy counterpart of rgb_color_finder: returns a boolean mask of
+    pixels of an (height, width, 3) array that match the color range"""
+    mask = None
+    for i, (c_min, c_max) in enumerate(zip(color_min, color_max)):
+        band = rgb_arr[..., i]
+        if c_min == c_max:
+            in_range = band == c_min
+        else:
+            in_range = (band >= c_min) & (band <= c_max)
+        if mask is None:
+            mask = in_range
+        elif all_bands:
+            mask &= in_range
+        else:
+            mask |= in_range
+    return mask
+
+
+def rgb_color_replacer_by_mask_array(rgb_arr, color, color_mask):
+    """NumPy counterpart of rgb_color_replacer_by_mask"""
+    rpl_arr = rgb_arr.copy()
+    for i, c in enumerate(color):
+        rpl_arr[..., i][color_mask] = c
+    return rpl_arr
+
+
+def get_mask_bbox(mask):
+    """bounding box of False pixels in the mask (None if there are none)"""
+    rows = np.flatnonzero(~mask.all(axis=1))
+    cols = np.flatnonzero(~mask.all(axis=0))
+    if not len(rows):
+        return None
+    return cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+
+
+def crop_array(arr, bbox, fill=0):
+    """crop the array like Image.crop, filling the area outside the image"""
+    left, upper, right, lower = bbox
+    height, width = arr.shape[:2]
+    cropped = np.full((lower - upper, right - left) + arr.shape[2:], fill,
+                      dtype=arr.dtype)
+    x0, y0 = max(left, 0), max(upper, 0)
+    x1, y1 = min(right, width), min(lower, height)
+    if x0 < x1 and y0 < y1:
+        cropped[y0 - upper:y1 - upper, x0 - left:x1 - left] = arr[y0:y1, x0:x1]
+    return cropped
+
+
+def expand_bbox(bbox, border):
+    return (bbox[0]-border, bbox[1]-border,
+            bbox[2]+border, bbox[3]+border)
+
+
+def trim_pil(pim, t, args):
+    """returns the trimmed image, its copy with white background and
+    the mask of the background"""
+    bbox = expand_bbox(get_bbox(pim, t) or (0, 0) + pim.size, args.border)
+    if not args.nocrop:
+        pim = pim.crop(bbox)
+    color_mask = rgb_color_finder(pim, t, t, all_bands=1)
+    wim = rgb_color_replacer_by_mask(pim, (255, 255, 255), color_mask)
+    return pim, wim, color_mask
+
+
+def trim_numpy(pim, t, args):
+    """same as trim_pil, but finds the background, bounding box and
+    replaces the background from a single mask"""
+    arr = np.asarray(pim)
+    mask = rgb_color_finder_array(arr, t, t)
+    if not args.nocrop:
+        bbox = get_mask_bbox(mask) or (0, 0, arr.shape[1], arr.shape[0])
+        bbox = expand_bbox(bbox, args.border)
+        arr = crop_array(arr, bbox)
+        # Image.crop pads with black, which is background if t is black
+        mask = crop_array(mask, bbox, fill=t == (0, 0, 0))
+    wim = rgb_color_replacer_by_mask_array(arr, (255, 255, 255), mask)
+    return Image.fromarray(arr), Image.fromarray(wim), Image.fromarray(mask)
+
+
+def indexed_image(rgb_img, t=None, color_mask=None, colors=256,
+                  palette=None):
+    """converts the image to a palette of at most `colors` colors using
+    Floyd-Steinberg dithering; the palette is computed from the image unless
+    given as a "P" image. Pixels in color_mask are set to color t, which gets
+    its own palette entry (the palette must then have less than `colors`
+    colors). Returns the image and the index of t (None if no mask)"""
+    if color_mask is not None:
+        colors -= 1
+    if palette is None:
+        palette = rgb_img.quantize(colors)
+    pal_img = rgb_img.quantize(palette=palette, dither=Image.FLOYDSTEINBERG)
+    if color_mask is None:
+        return pal_img, None
+    pal_values = palette.getpalette()[:3 * colors]
+    transparent = len(pal_values) // 3
+    pal_img.paste(transparent, mask=color_mask)
+    pal_img.putpalette(pal_values + list(t))
+    return pal_img, transparent
+
+
+def output_name(file_path, args):
+    """output file name without extension"""
     file_fullname, file_extension = os.path.splitext(file_path)
-    file_name = os.path.basename(file_fullname)
+    return os.path.join(args.output_dir, os.path.basename(file_fullname))
+
+
+def process(file_path, args):
+    """trim the image and make a thumbnail; returns the output file names"""
+    file_name = output_name(file_path, args)
     im = Image.open("%s" % file_path)
     print(".. processing %s, size %s" % (file_path, str(im.size)))
 
-    # compute bounding box for cropping
     pim = im.convert("RGB", palette=Image.ADAPTIVE)
-
     t = pim.getpixel((1, 1))
-    bbox = get_bbox(pim, t)
-    bbox = (bbox[0]-args.border, bbox[1]-args.border,
-            bbox[2]+args.border, bbox[3]+args.border)
-    if not args.nocrop:
-        pim = pim.crop(bbox)
+    if args.engine == "numpy":
+        pim, wim, color_mask = trim_numpy(pim, t, args)
+    else:
+        pim, wim, color_mask = trim_pil(pim, t, args)
     print("   -> trimming: %s.png, size %s, width at 80%% is %d" %
           (file_name, str(pim.size), int(pim.size[0]*0.8)))
 
     # transparent background
     pim.save("%s.png" % file_name, transparency=t)
+    outputs = ["%s.png" % file_name]
+
+    if args.indexed:
+        index_dir = os.path.join(os.path.dirname(file_name), "indexed")
+        os.makedirs(index_dir, exist_ok=True)
+        index_name = os.path.join(index_dir, os.path.basename(file_name))
+        iim, transparent = indexed_image(pim, t, color_mask)
+        iim.save("%s.png" % index_name, transparency=transparent)
+        outputs.append("%s.png" % index_name)
+        print("   -> indexed: %s.png" % index_name)
 
-    color_mask = rgb_color_finder(pim, t, t, all_bands=1)
-    wim = rgb_color_replacer_by_mask(pim, (255, 255, 255), color_mask)
     wim.thumbnail(thumbnail_size, Image.LANCZOS)
     wim = wim.filter(ImageFilter.DETAIL)
     wim.save("%s.thumb.png" % file_name)
     print("   -> thumb: %s.thumb.png, size %s" % (file_name, str(wim.size)))
+    return outputs + ["%s.thumb.png" % file_name]
+
+
+def process_safely(file_path, args):
+    """process the file; returns its printout, output files (None if
+    processing failed) and error message"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            outputs = process(file_path, args)
+        except Exception as ex:
+            return output.getvalue(), None, "%s: %s" % (type(ex).__name__, ex)
+    return output.getvalue(), outputs, None
+
+
+def build_key(file_path, args):
+    """hash of the file's content and options that affect the outputs"""
+    with open(file_path, "rb") as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+    return dict(hash=content_hash, border=args.border, nocrop=args.nocrop,
+                indexed=args.indexed, thumbnail_size=list(thumbnail_size))
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def find_files(patterns, recursive=False):
+    """file names from a list of file names, directories and glob patterns;
+    directories are searched for png files that are not thumbnails"""
+    files = []
+    for pattern in patterns:
+        for name in pattern.split():
+            if os.path.isdir(name):
+                found = glob.glob(os.path.join(name, "**" if recursive else "",
+                                               "*.png"),
+                                  recursive=recursive)
+                files += sorted(f for f in found
+                                if not f.endswith(".thumb.png"))
+            elif any(c in name for c in "*?["):
+                files += sorted(glob.glob(name, recursive=True))
+            else:
+                files.append(name)
+    return list(dict.fromkeys(files))
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-n", "--nocrop", help="crop image",
                         action="store_true", default=False)
-    parser.add_argument("-b", "--border", help="border width", default=3)
-    parser.add_argument("files", type=str, help="file names to match")
+    parser.add_argument("-b", "--border", help="border width", type=int,
+                        default=3)
+    parser.add_argument("-e", "--engine", choices=("numpy", "pil"),
+                        default="numpy" if np is not None else "pil",
+                        help="image processing engine (default: numpy, "
+                             "if installed)")
+    parser.add_argument("-o", "--output-dir", default="",
+                        help="directory for output files (default: current)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="search directories recursively")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of parallel processes "
+                             "(default: number of cores)")
+    parser.add_argument("-i", "--indexed", action="store_true",
+                        help="also save a 256-color dithered copy of the "
+                             "trimmed image to indexed/")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="process files even if they did not change")
+    parser.add_argument("files", type=str, nargs="+",
+                        help="file names, directories or glob patterns")
     arguments = parser.parse_args()
 
-    for f_name in arguments.files.split():
-        process(f_name, arguments)
+    files = find_files(arguments.files, arguments.recursive)
+    if arguments.output_dir:
+        os.makedirs(arguments.output_dir, exist_ok=True)
+
+    # outputs (and manifest entries) are named by input's base name, so
+    # files with the same name in different directories would overwrite
+    # each other
+    by_output = {}
+    for f_name in files:
+        by_output.setdefault(output_name(f_name, arguments), []).append(f_name)
+    failed = [(f_name, "output %s.png is also written by %s"
+               % (out, ", ".join(other for other in same if other != f_name)))
+              for out, same in by_output.items() if len(same) > 1
+              for f_name in same]
+    colliding = {f_name for f_name, _ in failed}
+    for f_name, error in failed:
+        print("%s\n   !! failed: %s" % (f_name, error))
+    files = [f_name for f_name in files if f_name not in colliding]
+
+    manifest_path = os.path.join(arguments.output_dir, MANIFEST)
+    manifest = load_manifest(manifest_path)
+    keys, unchanged = {}, set()
+    for f_name in files:
+        try:
+            keys[f_name] = build_key(f_name, arguments)
+        except OSError:
+            continue  # processing will fail and report it
+        entry = manifest.get(os.path.basename(output_name(f_name, arguments)))
+        if not arguments.force and entry is not None \
+                and entry["key"] == keys[f_name] \
+                and all(os.path.exists(os.path.join(arguments.output_dir, out))
+                        for out in entry["outputs"]):
+            unchanged.add(f_name)
+    files = [f_name for f_name in files if f_name not in unchanged]
+
+    def report(f_name, output, outputs, error):
+        if len(files) > 1:
+            print("[%d/%d] %s" % (done, len(files), f_name))
+        print(output, end="")
+        if error:
+            print("   !! failed: %s" % error)
+            failed.append((f_name, error))
+        elif f_name in keys:
+            manifest[os.path.basename(output_name(f_name, arguments))] = \
+                dict(key=keys[f_name],
+                     outputs=[os.path.relpath(out, arguments.output_dir or ".")
+                              for out in outputs])
+
+    done = 0
+    if arguments.jobs == 1 or len(files) <= 1:
+        for f_name in files:
+            done += 1
+            report(f_name, *process_safely(f_name, arguments))
+    else:
+        with ProcessPoolExecutor(arguments.jobs) as executor:
+            futures = {executor.submit(process_safely, f_name, arguments): f_name
+                       for f_name in files}
+            for future in as_completed(futures):
+                done += 1
+                report(futures[future], *future.result())
+
+    if files:
+        save_manifest(manifest_path, manifest)
+    if unchanged:
+        print("Skipped %d unchanged files" % len(unchanged))
+    if len(files) + len(colliding) > 1:
+        print("Processed %d files, %d failed"
+              % (len(files) + len(colliding), len(failed)))
+        for f_name, error in failed:
+            print("  %s: %s" % (f_name, error))
+    return int(bool(failed))
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Structural differences between two workflows.
+
+Widgets are matched by their titles and types, so differences do not depend
+on node ids, which change when widgets are removed; a widget whose title
+changed is matched by its id, and widgets with the same title and type by
+their ids. Settings that are encoded identically in both workflows are
+compared by hashes and are not decoded; others are compared value by
+value. Widget positions and window geometry are ignored.
+
+    % python workflow_diff.py old.ows new.ows
+"""
+
+import argparse
+import hashlib
+import sys
+from collections import Counter
+from pprint import pformat
+
+try:
+    from tools.showWorkflow import iter_elements, Settings, IGNORE
+except ImportError:  # run as a script from the tools directory
+    from showWorkflow import iter_elements, Settings, IGNORE
+
+# contexts are compared like other settings
+DIFF_IGNORE = IGNORE - {"context_settings"}
+
+
+class Workflow:
+    """Widgets, links and (encoded) settings of a workflow"""
+
+    def __init__(self, fname):
+        nodes = {}  # node id -> (title, qualified name)
+        links = []
+        self.settings = {}  # node id -> Settings
+        self.hashes = {}  # node id -> hash of encoded settings
+        for elem in iter_elements(fname, ("node", "link", "properties")):
+            if elem.tag == "node":
+                nodes[elem.get("id")] = \
+                    (elem.get("title") or elem.get("name"),
+                     elem.get("qualified_name"))
+            elif elem.tag == "link":
+                links.append((
+                    elem.get("source_node_id"), elem.get("source_channel"),
+                    elem.get("sink_node_id"), elem.get("sink_channel"),
+                    elem.get("enabled") != "false"))
+            else:
+                wid, format, text = \
+                    elem.get("node_id"), elem.get("format"), elem.text or ""
+                self.settings[wid] = Settings(format, text)
+                self.hashes[wid] = hashlib.sha256(
+                    f"{format}\n{text}".encode()).digest()
+        # widgets are keyed by titles and types; widgets with the same title
+        # and type are told apart by their node ids
+        counts = Counter(nodes.values())
+        self.widgets = {wid: widget if counts[widget] == 1 else widget + (wid,)
+                        for wid, widget in nodes.items()}
+        self.links = {(self.widgets[source], source_channel,
+                       self.widgets[sink], sink_channel, enabled)
+                      for source, source_channel, sink, sink_channel, enabled
+                      in links}
+        self.ids = {widget: wid for wid, widget in self.widgets.items()}
+
+
+def normalized(value):
+    """Value with objects replaced by their classes and attributes, so that
+    values compare equal if they contain equal data"""
+    if isinstance(value, dict):
+        return {key: normalized(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(normalized(val) for val in value)
+    if isinstance(value, (set, frozenset)):
+        return sorted((normalized(val) for val in value), key=repr)
+    if hasattr(value, "dtype") and hasattr(value, "tolist"):
+        # numpy arrays do not compare to a single truth value
+        return (str(value.dtype), getattr(value, "shape", ()), value.tolist())
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        return (type(value).__name__, normalized(vars(value)))
+    return value
+
+
+def settings_diff(old, new):
+    """Yield (name, old value, new value) for changed settings; missing
+    settings are reported as None"""
+    old, new = normalized(old.values), normalized(new.values)
+    for name in list(old) + [name for name in new if name not in old]:
+        if name in DIFF_IGNORE:
+            continue
+        if old.get(name) != new.get(name):
+            yield name, old.get(name), new.get(name)
+
+
+def workflow_diff(old, new):
+    """Yield lines describing differences between workflows"""
+    def widget_name(widget):
+        return f"{widget[0]} ({widget[1]})" \
+               + (f" [node {widget[2]}]" if len(widget) > 2 else "")
+
+    # widgets are matched by titles and types; widgets with a changed title
+    # are matched by id and type
+    removed = sorted(old.ids.keys() - new.ids.keys())
+    added = sorted(new.ids.keys() - old.ids.keys())
+    renamed = {}
+    for widget in removed:
+        candidate = new.widgets.get(old.ids[widget])
+        if candidate in added and candidate[1] == widget[1]:
+            renamed[widget] = candidate
+            added.remove(candidate)
+    for widget in removed:
+        if widget in renamed:
+            yield f"~ widget {widget_name(widget)} " \
+                  f"renamed to {renamed[widget][0]}"
+        else:
+            yield f"- widget {widget_name(widget)}"
+    for widget in added:
+        yield f"+ widget {widget_name(widget)}"
+
+    matched = [(widget, widget)
+               for widget in sorted(old.ids.keys() & new.ids.keys())]
+    for old_widget, new_widget in matched + sorted(renamed.items()):
+        old_id, new_id = old.ids[old_widget], new.ids[new_widget]
+        if old.hashes.get(old_id) == new.hashes.get(new_id):
+            continue
+        if old_id not in old.settings or new_id not in new.settings:
+            yield f"~ widget {widget_name(new_widget)}: settings " \
+                  + ("added" if old_id not in old.settings else "removed")
+            continue
+        try:
+            changes = list(settings_diff(old.settings[old_id],
+                                         new.settings[new_id]))
+        except Exception as ex:
+            yield f"~ widget {widget_name(new_widget)}: " \
+                  f"settings can not be compared ({ex})"
+            continue
+        if changes:
+            yield f"~ widget {widget_name(new_widget)}"
+        for name, old_value, new_value in changes:
+            yield f"    {name}: {pformat(old_value)} -> {pformat(new_value)}"\
+                .replace("\n", "\n      ")
+
+    def link_name(link):
+        source, source_channel, sink, sink_channel, enabled = link
+        return f"{source[0]}.{source_channel} -> {sink[0]}.{sink_channel}" \
+               + ("" if enabled else " (disabled)")
+
+    # links of renamed widgets are compared with new titles
+    old_links = {(renamed.get(source, source), source_channel,
+                  renamed.get(sink, sink), sink_channel, enabled)
+                 for source, source_channel, sink, sink_channel, enabled
+                 in old.links}
+    for link in sorted(old_links - new.links):
+        yield f"- link {link_name(link)}"
+    for link in sorted(new.links - old_links):
+        yield f"+ link {link_name(link)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show differences between two workflows.")
+    parser.add_argument("old", help="original workflow (.ows)")
+    parser.add_argument("new", help="changed workflow (.ows)")
+    args = parser.parse_args()
+
+    different = False
+    for line in workflow_diff(Workflow(args.old), Workflow(args.new)):
+        print(line)
+        different = True
+    return int(different)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Index of widgets and their settings in many workflows.
+
+Workflows (.ows) in the given directories are scanned in parallel; the
+index of their widgets and settings is kept in a JSON file and only
+workflows that changed since the last run (by modification time and, if
+that differs, by content hash) are read again.
+
+    % python workflow_index.py workflows/ -w scatter -s alpha -v 128
+
+lists all Scatter Plot widgets whose setting `alpha` contains "128". Without
+a query, widgets are listed with the number of workflows that use them.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from tools.showWorkflow import iter_elements, Settings, IGNORE
+except ImportError:  # run as a script from the tools directory
+    from showWorkflow import iter_elements, Settings, IGNORE
+
+INDEX = ".workflow-index.json"
+# longer reprs of values are truncated in the index
+MAX_VALUE_LENGTH = 1000
+
+
+def file_hash(file_path):
+    return hashlib.sha256(pathlib.Path(file_path).read_bytes()).hexdigest()
+
+
+def setting_values(settings):
+    """Reprs of settings; if they can not be unpickled (e.g. because the
+    widget's module is missing), keys without values. Keys are strings, as
+    in JSON."""
+    try:
+        values = settings.values
+    except Exception:
+        return {str(key): None
+                for key in settings.sizes() if key not in IGNORE}
+    return {str(key): repr(value)[:MAX_VALUE_LENGTH]
+            for key, value in values.items() if key not in IGNORE}
+
+
+def index_workflow(file_path):
+    """Widgets of the workflow, with their settings"""
+    widgets = {}
+    for elem in iter_elements(file_path, ("node", "properties")):
+        if elem.tag == "node":
+            widgets[elem.get("id")] = dict(
+                name=elem.get("name"),
+                qualified_name=elem.get("qualified_name"),
+                settings={})
+        else:
+            settings = Settings(elem.get("format"), elem.text)
+            widgets[elem.get("node_id")]["settings"] = setting_values(settings)
+    stat = os.stat(file_path)
+    return dict(hash=file_hash(file_path), mtime=stat.st_mtime_ns,
+                size=stat.st_size, widgets=widgets)
+
+
+def load_index(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_index(path, index):
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def update_index(index, paths, jobs):
+    """
+    Re-index new and changed workflows in `paths` and drop removed ones.
+    Return the workflows in `paths` and those that could not be read.
+    """
+    files = sorted({str(file_path.resolve())
+                    for path in paths
+                    for file_path in pathlib.Path(path).rglob("*.ows")})
+    for file_path in list(index):
+        if not os.path.exists(file_path):
+            del index[file_path]
+
+    todo = []
+    for file_path in files:
+        entry = index.get(file_path)
+        if entry is not None:
+            stat = os.stat(file_path)
+            if (entry["mtime"], entry["size"]) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            if entry["hash"] == file_hash(file_path):  # e.g. copied or touched
+                entry["mtime"], entry["size"] = stat.st_mtime_ns, stat.st_size
+                continue
+        todo.append(file_path)
+
+    failed = []
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = {executor.submit(index_workflow, file_path): file_path
+                   for file_path in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_path = futures[future]
+            try:
+                index[file_path] = future.result()
+            except Exception as ex:
+                failed.append(file_path)
+                index.pop(file_path, None)
+                print(f"[{done}/{len(todo)}] {file_path} failed: {ex}",
+                      file=sys.stderr)
+    print(f"Workflows indexed: {len(todo) - len(failed)}, "
+          f"unchanged: {len(files) - len(todo)}, failed: {len(failed)}",
+          file=sys.stderr)
+    return files, failed
+
+
+def search(index, widget=None, setting=None, value=None):
+    """
+    Yield (workflow, widget id, widget, setting, value) for widgets whose
+    name or qualified name contains `widget`, with settings whose name
+    contains `setting` and whose value's repr contains `value`
+    (all case-insensitive; None matches anything).
+    """
+    widget, setting, value = (
+        s and s.lower() for s in (widget, setting, value))
+    for file_path, entry in sorted(index.items()):
+        for wid, node in entry["widgets"].items():
+            if widget and widget not in node["name"].lower() \
+                    and widget not in node["qualified_name"].lower():
+                continue
+            if not setting and not value:
+                yield file_path, wid, node, None, None
+                continue
+            for key, val in node["settings"].items():
+                if setting and setting not in key.lower():
+                    continue
+                if value and (val is None or value not in val.lower()):
+                    continue
+                yield file_path, wid, node, key, val
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index and search widgets and settings in workflows.")
+    parser.add_argument("paths", nargs="+",
+                        help="directories with workflows (searched recursively)")
+    parser.add_argument("-w", "--widget", help="widget (part of the name)")
+    parser.add_argument("-s", "--setting", help="setting (part of the name)")
+    parser.add_argument("-v", "--value", help="part of the setting's value")
+    parser.add_argument("-i", "--index", default=INDEX,
+                        help=f"index file (default: {INDEX})")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of parallel processes "
+                             "(default: number of cores)")
+    args = parser.parse_args()
+
+    index = load_index(args.index)
+    files, failed = update_index(index, args.paths, args.jobs)
+    save_index(args.index, index)
+    # the index may also contain workflows from other directories
+    index = {file_path: index[file_path]
+             for file_path in files if file_path in index}
+
+    if not (args.widget or args.setting or args.value):
+        usage = Counter(qualified_name
+                        for entry in index.values()
+                        for qualified_name in {
+                            node["qualified_name"]
+                            for node in entry["widgets"].values()})
+        for qualified_name, count in usage.most_common():
+            print(f"{count:5} {qualified_name}")
+        return int(bool(failed))
+
+    for file_path, wid, node, key, value in search(
+            index, args.widget, args.setting, args.value):
+        line = f"{file_path}:{wid} {node['name']} ({node['qualified_name']})"
+        if key is not None:
+            line += f" {key}" + ("" if value is None else f" = {value}")
+        print(line)
+    return int(bool(failed))
+
+
+if __name__ == "__main__":
+    sys.exit(main())